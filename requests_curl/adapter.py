@@ -1,8 +1,13 @@
 """Requests adapter implementing a CURL backend"""
 
+import os
 import pycurl
+import threading
+import time
 
-from requests.exceptions import RequestException
+from collections import deque
+
+from requests.exceptions import RequestException, RetryError
 from requests.utils import select_proxy
 from requests.adapters import (
     BaseAdapter,
@@ -10,16 +15,62 @@ from requests.adapters import (
     DEFAULT_POOLSIZE,
     DEFAULT_POOLBLOCK,
 )
+from urllib3.util import Timeout
 from urllib3.util.retry import Retry
-from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import InvalidHeader, MaxRetryError
 
+from .pool import EmptyPool, keep_inherited
 from .pool_provider import CURLPoolProvider
-from .error import translate_curl_exception
-from .request import CURLRequest
+from .multi import CURLMulti
+from .executor import CURLExecutor
+from .stream import CURLStreamingBody
+from .error import ResponseBodyTooLarge, to_requests_exception
+from .request import CURLRequest, split_timeout
+from .response import CURLRawResponse
+from .tls import CURLTLSConfig
 
 
 class CURLAdapter(BaseAdapter):
-    """A requests adapter implemented using PyCURL"""
+    """A requests adapter implemented using PyCURL
+
+    With `http2`, requests are made using HTTP/2 when the server supports it, which is
+    negotiated during the TLS handshake. For plain HTTP servers known to support HTTP/2,
+    `http2_prior_knowledge` uses it without negotiation (h2c). In both cases, concurrent
+    requests are multiplexed over a single connection per origin: requests sent from many
+    threads are all driven by a background `CURLExecutor`, since only transfers of the
+    same `pycurl.CurlMulti` can share a connection.
+
+    With `native_decoding`, compressed response bodies are decoded by libcurl while they
+    are received, instead of by urllib3 while they are read. Responses keep their
+    Content-Encoding header.
+
+    Response bodies kept in memory that are larger than `spool_size` bytes are moved to a
+    temporary file while they are received, and read from it afterwards. Transfers of
+    bodies larger than `max_body_size` bytes are aborted as soon as that is known, raising
+    `ResponseBodyTooLarge`, which is never retried.
+
+    Besides failed requests, `send` retries responses whose status `max_retries` retries,
+    such as the ones in its `status_forcelist`, waiting for as long as their Retry-After
+    header asks to. Retries send the same `CURLRequest` again, rewinding its body.
+
+    When the timeout of a request is an `urllib3.util.Timeout` with a total, that total
+    limits the whole `send` call: all of its attempts, and the backoff between them.
+
+    With a `hedge_policy` (see `CURLHedgePolicy`), `send` hedges the requests the policy
+    applies to: if there is no response after the delay of the policy, a second copy is
+    sent on another handler of the same pool, and the first one to complete wins. Both
+    copies are driven by a `pycurl.CurlMulti`, which each thread keeps, along with the
+    connections it opens, until it ends. Streamed responses and HTTP/2 requests, which
+    are multiplexed by the executor, are not hedged.
+
+    Adapters can be created before forking, for example by pre-fork servers such as
+    gunicorn: child processes don't use the CURL handlers, nor the connections, of the
+    parent process, and create their own ones instead.
+    """
+
+    # Size of the buffer bodies are received in by `download`, fewer and larger writes
+    # make downloads faster
+    DOWNLOAD_BUFFER_SIZE = 512 * 1024
 
     def __init__(
         self,
@@ -27,7 +78,16 @@ class CURLAdapter(BaseAdapter):
         max_pools_count=DEFAULT_POOLSIZE,
         max_pool_size=DEFAULT_POOLSIZE,
         pool_block=DEFAULT_POOLBLOCK,
+        pool_warm_size=0,
+        max_proxies_count=DEFAULT_POOLSIZE,
         pool_provider_factory=CURLPoolProvider,
+        multi_factory=CURLMulti,
+        http2=False,
+        http2_prior_knowledge=False,
+        native_decoding=False,
+        spool_size=None,
+        max_body_size=None,
+        hedge_policy=None,
     ):
         super(CURLAdapter, self).__init__()
 
@@ -40,7 +100,28 @@ class CURLAdapter(BaseAdapter):
             max_pools=max_pools_count,
             max_pool_size=max_pool_size,
             pool_block=pool_block,
+            pool_warm_size=pool_warm_size,
+            max_proxies=max_proxies_count,
         )
+        self._multi_factory = multi_factory
+
+        if http2_prior_knowledge:
+            self._http_version = pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE
+        elif http2:
+            self._http_version = pycurl.CURL_HTTP_VERSION_2TLS
+        else:
+            self._http_version = None
+
+        self._native_decoding = native_decoding
+        self._spool_size = spool_size
+        self._max_body_size = max_body_size
+        self._hedge_policy = hedge_policy
+        # Multi of each thread that drives its hedged requests, and keeps their connections
+        self._hedge_multis = threading.local()
+        self._executor = None
+        # Process that started the executor, whose thread only runs in that process
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
 
     def send(
         self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
@@ -50,10 +131,12 @@ class CURLAdapter(BaseAdapter):
         Args:
             request (PreparedRequest): the request being sent.
             stream (bool, optional): Defaults to False. Whether to stream the
-                request content.
+                response content. If True, the body is received as it is read.
             timeout (float, optional): Defaults to None. How many seconds to
                 wait for the server to send data before giving up, as a float,
-                or a `(connect timeout, read timeout)` tuple.
+                or a `(connect timeout, read timeout)` tuple, or an
+                `urllib3.util.Timeout` whose total limits the whole call, retries
+                included.
             verify (bool, optional): Defaults to True. Either a boolean, in
                 which case it controls whether we verify the server's TLS
                 certificate, or a string, in which case it must be a path
@@ -70,74 +153,576 @@ class CURLAdapter(BaseAdapter):
             requests.exceptions.ReadTimeout: if request failed due to a read timeout.
             requests.exceptions.ConnectionError: if there is a problem with the
                 connection (default error).
+            requests.exceptions.RetryError: if responses were retried too many times.
 
         Returns:
             request.Response: the response to the request.
         """
         retries = self.max_retries
+        budget = _TimeoutBudget.from_timeout(timeout)
+        # Built once, every attempt sends it again
+        curl_request = self._build_curl_request(request, timeout, verify, cert)
 
         try:
             while not retries.is_exhausted():
+                if budget is not None:
+                    curl_request.set_timeout(budget.start_attempt())
+
                 try:
                     response = self._curl_send(
-                        request,
-                        stream=stream,
-                        timeout=timeout,
-                        verify=verify,
-                        cert=cert,
-                        proxies=proxies,
+                        curl_request, stream=stream, proxies=proxies
                     )
 
-                    return response
+                except ResponseBodyTooLarge:
+                    # The body would be just as large on every attempt
+                    raise
 
                 except RequestException as error:
                     retries = retries.increment(
                         method=request.method, url=request.url, error=error
                     )
-                    retries.sleep()
+
+                    if not curl_request.rewind():
+                        raise error
+
+                    if budget is None:
+                        retries.sleep()
+                    elif not budget.sleep(retries.get_backoff_time()):
+                        raise budget.final_error(error)
+
+                    continue
+
+                has_retry_after = "Retry-After" in response.headers
+                if not retries.is_retry(
+                    request.method, response.status_code, has_retry_after
+                ):
+                    return response
+
+                try:
+                    retries = retries.increment(
+                        method=request.method, url=request.url, response=response.raw
+                    )
+                except MaxRetryError as retry_error:
+                    if retries.raise_on_status:
+                        raise RetryError(retry_error, request=request)
+
+                    return response
+
+                sleep_time = _get_retry_sleep_time(retries, response)
+                if not curl_request.rewind() or (
+                    budget is not None and not budget.has_time_for(sleep_time)
+                ):
+                    return response
+
+                response.close()
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
 
         except MaxRetryError as retry_error:
-            raise retry_error.reason
+            if budget is None:
+                raise retry_error.reason
 
-    def _curl_send(
-        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+            raise budget.final_error(retry_error.reason)
+
+    def send_many(
+        self,
+        requests,
+        concurrency=10,
+        timeout=None,
+        verify=True,
+        cert=None,
+        proxies=None,
+        return_exceptions=False,
     ):
-        """Translates the `requests.PreparedRequest` into a CURLRequest, performs the request, and then
+        """Sends many PreparedRequest objects concurrently from the calling thread, using a
+        single `pycurl.CurlMulti`. Responses are yielded as soon as they complete, so they
+        may not follow the order of the given requests. Use `response.request` to match them.
+
+        Failed transfers are not retried, and response bodies are always fully loaded.
+        Requests whose pool has no handler available wait for a transfer of the same pool
+        to complete, while requests to other pools keep being started.
+
+        Args:
+            requests (iterable): the PreparedRequest objects to be sent.
+            concurrency (int, optional): Defaults to 10. Maximum number of transfers to run
+                at the same time. It is also bounded by the size of each host pool.
+            timeout (float, optional): Defaults to None. Same as in `send`.
+            verify (bool, optional): Defaults to True. Same as in `send`.
+            cert (str, optional): Defaults to None. Same as in `send`.
+            proxies (dict,  optional): Defaults to None. Same as in `send`.
+            return_exceptions (bool, optional): Defaults to False. If True, the exception of
+                a failed request is yielded instead of being raised.
+
+        Raises:
+            ValueError: if `concurrency` is lower than 1.
+            requests.exceptions.RequestException: if a request fails and `return_exceptions`
+                is False. Transfers still in progress are aborted.
+            EmptyPool: if a pool has no handler available and there are no running transfers
+                of that pool that could give one back. This is raised even if
+                `return_exceptions` is True.
+
+        Yields:
+            request.Response: the response to each request, as they complete.
+        """
+        if concurrency < 1:
+            raise ValueError(
+                "concurrency must be at least 1, got {0}".format(concurrency)
+            )
+
+        pending = deque(requests)
+        # Requests whose pool had no handler available, by pool, and the number of
+        # running transfers of each pool, which give their handlers back to it
+        waiting = {}
+        running = {}
+        tls_config = CURLTLSConfig.get(verify, cert)
+        multi = self._create_multi()
+        completed = deque()
+
+        try:
+            while pending or len(multi):
+                while pending and len(multi) < concurrency:
+                    request = pending.popleft()
+
+                    try:
+                        pool = self._get_curl_connection(
+                            request.url, proxies, tls_config
+                        )
+
+                        if pool in waiting:
+                            # Keeps the order of the requests to the same pool
+                            waiting[pool].append(request)
+                            continue
+
+                        transfer = self._start_curl_transfer(
+                            request,
+                            timeout=timeout,
+                            verify=verify,
+                            cert=cert,
+                            proxies=proxies,
+                            block=False,
+                        )
+                    except EmptyPool:
+                        if not running.get(pool):
+                            raise
+                        # Wait for a running transfer of the pool to give back its handler
+                        waiting[pool] = deque([request])
+                        continue
+                    except RequestException as error:
+                        if not return_exceptions:
+                            raise
+                        yield error
+                        continue
+
+                    running[pool] = running.get(pool, 0) + 1
+                    multi.add_transfer(transfer)
+
+                completed.extend(multi.perform())
+                if not completed:
+                    multi.wait()
+
+                while completed:
+                    transfer, curl_error = completed.popleft()
+
+                    # The handler of the transfer is given back to its pool below, so
+                    # the requests waiting for the pool are tried again first
+                    running[transfer.pool] -= 1
+                    pending.extendleft(reversed(waiting.pop(transfer.pool, ())))
+
+                    if curl_error is None:
+                        yield transfer.finish().to_requests_response()
+                    else:
+                        transfer.fail(curl_error)
+                        error = to_requests_exception(
+                            curl_error, transfer.response.request
+                        )
+                        if not return_exceptions:
+                            raise error
+                        yield error
+
+        finally:
+            # Transfers that completed but were not consumed are no longer in the multi
+            for transfer, _ in completed:
+                transfer.abort()
+
+            multi.close()
+
+    def download(
+        self, request, destination, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        """Sends PreparedRequest object using PyCURL, writing the response body to the
+        given destination instead of keeping it in memory. The handler writes every chunk
+        of the body straight into the file, as it is received.
+
+        Compressed bodies are decoded by libcurl, so the file holds the decoded body. The
+        body of the response is written whatever its status code, and redirects are not
+        followed. Failed downloads are not retried.
+
+        Args:
+            request (PreparedRequest): the request being sent.
+            destination (str or file-like): Either the path of the file to write the body
+                to, which is created or truncated, or a binary file object open for
+                writing. A file created from a path is removed if the download fails.
+            timeout (float, optional): Defaults to None. Same as in `send`.
+            verify (bool, optional): Defaults to True. Same as in `send`.
+            cert (str, optional): Defaults to None. Same as in `send`.
+            proxies (dict,  optional): Defaults to None. Same as in `send`.
+
+        Raises:
+            requests.exceptions.RequestException: if the request fails, just like in `send`.
+
+        Returns:
+            request.Response: the response to the request. It has no content, since the
+                body was written to the destination.
+        """
+        if hasattr(destination, "write"):
+            return self._curl_download(
+                request, destination, timeout, verify, cert, proxies
+            )
+
+        destination_file = open(destination, "wb")
+
+        try:
+            with destination_file:
+                return self._curl_download(
+                    request, destination_file, timeout, verify, cert, proxies
+                )
+        except Exception:
+            os.remove(destination)
+            raise
+
+    def _curl_download(self, request, destination, timeout, verify, cert, proxies):
+        try:
+            curl_request = self._build_curl_request(
+                request,
+                timeout,
+                verify,
+                cert,
+                native_decoding=True,
+                receive_buffer_size=self.DOWNLOAD_BUFFER_SIZE,
+            )
+            curl_connection = self._get_curl_connection(
+                request.url, proxies, curl_request.tls_config
+            )
+
+            response = curl_connection.send(curl_request, body=destination)
+
+        except pycurl.error as curl_error:
+            raise to_requests_exception(curl_error, request)
+
+        raw = CURLRawResponse(
+            b"", response.headers, response.http_code, reason=response.reason
+        )
+        return response.to_requests_response(raw=raw)
+
+    def _curl_send(self, curl_request, stream=False, proxies=None):
+        """Performs the CURLRequest of a `requests.PreparedRequest`, and then
         translates the repsonse to a `requests.Response`, and if there is any exception, it is also
         translated into an appropiate `requests.exceptions.RequestException` subclass."""
+        request = curl_request.request
+
+        if self._http_version is not None and not stream:
+            future = self._get_executor().submit(
+                request, proxies=proxies, curl_request=curl_request
+            )
+            return future.result()
+
         try:
-            curl_connection = self._get_curl_connection(request.url, proxies)
-            curl_request = CURLRequest(
-                request, timeout=timeout, cert=cert, verify=verify
+            curl_connection = self._get_curl_connection(
+                request.url, proxies, curl_request.tls_config
             )
 
-            response = curl_connection.send(curl_request)
+            if stream:
+                body = CURLStreamingBody(multi_factory=self._create_multi)
+                transfer = curl_connection.start_transfer(curl_request, body=body)
+                body.start(transfer)
+                response = transfer.response
+            elif self._hedge_policy is not None and self._hedge_policy.applies_to(
+                request
+            ):
+                response = self._hedged_send(curl_connection, curl_request)
+            else:
+                response = curl_connection.send(curl_request)
 
             return response.to_requests_response()
 
         except pycurl.error as curl_error:
-            requests_exception = translate_curl_exception(curl_error)
-            raise requests_exception("CURL error {0}".format(curl_error.args))
+            raise to_requests_exception(curl_error, request)
+
+    def _hedged_send(self, curl_connection, curl_request):
+        """Performs the CURLRequest, sending a second copy of it on another handler of
+        the pool if there is no response after the delay of the hedge policy. The first
+        copy to complete successfully wins, and the other one is aborted."""
+        policy = self._hedge_policy
+        host_key = curl_connection.host_key
+        delay = policy.get_delay(host_key)
+
+        if delay is None:
+            response = curl_connection.send(curl_request)
+            policy.record_response(host_key, response.transfer_info)
+            return response
+
+        multi = self._get_hedge_multi()
+        hedge_time = time.monotonic() + delay
+        hedge = None
+        hedge_tried = False
+        completed = deque()
+
+        try:
+            multi.add_transfer(curl_connection.start_transfer(curl_request))
+
+            while True:
+                completed.extend(multi.perform())
+
+                while completed:
+                    transfer, curl_error = completed.popleft()
+
+                    if curl_error is None:
+                        response = transfer.finish()
+                        policy.record_response(
+                            host_key,
+                            response.transfer_info,
+                            hedged=hedge is not None,
+                            hedge_won=transfer is hedge,
+                        )
+                        return response
+
+                    transfer.fail(curl_error)
+                    # Failures are left to the retries, unless the other copy is running
+                    if not len(multi):
+                        raise curl_error
+
+                remaining = hedge_time - time.monotonic()
+
+                if not hedge_tried and remaining <= 0:
+                    hedge_tried = True
+
+                    try:
+                        hedge = curl_connection.start_transfer(
+                            curl_request, block=False
+                        )
+                    except EmptyPool:
+                        pass  # No handler to spare, so the first copy is waited for
+                    else:
+                        multi.add_transfer(hedge)
+                        continue
+
+                if hedge_tried:
+                    multi.wait()
+                else:
+                    multi.wait(timeout=remaining)
+
+        finally:
+            # The losing copy is aborted, giving its handler back to the pool
+            for transfer, _ in completed:
+                transfer.abort()
+
+            multi.abort_transfers()
+
+    def _start_curl_transfer(
+        self,
+        request,
+        timeout=None,
+        verify=True,
+        cert=None,
+        proxies=None,
+        block=None,
+        body=None,
+        curl_request=None,
+    ):
+        """Translates the `requests.PreparedRequest` into a CURLRequest, unless it is
+        given, and returns a CURLTransfer ready to be performed. The response body is
+        written to `body`, if given."""
+        try:
+            if curl_request is None:
+                curl_request = self._build_curl_request(request, timeout, verify, cert)
+
+            curl_connection = self._get_curl_connection(
+                request.url, proxies, curl_request.tls_config
+            )
+
+            return curl_connection.start_transfer(curl_request, block=block, body=body)
+
+        except pycurl.error as curl_error:
+            raise to_requests_exception(curl_error, request)
+
+    def _build_curl_request(self, request, timeout, verify, cert, **kwargs):
+        kwargs.setdefault("http_version", self._http_version)
+        kwargs.setdefault("native_decoding", self._native_decoding)
+        kwargs.setdefault("spool_size", self._spool_size)
+        kwargs.setdefault("max_body_size", self._max_body_size)
+
+        return CURLRequest(request, timeout=timeout, cert=cert, verify=verify, **kwargs)
+
+    def _create_multi(self):
+        multi = self._multi_factory()
+
+        if self._http_version is not None:
+            multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+
+        return multi
+
+    def _get_hedge_multi(self):
+        hedge_multis = self._hedge_multis
+
+        if getattr(hedge_multis, "pid", None) != os.getpid():
+            if getattr(hedge_multis, "multi", None) is not None:
+                # Inherited from the parent process, along with its connections
+                keep_inherited(hedge_multis.multi)
+
+            hedge_multis.multi = self._create_multi()
+            hedge_multis.pid = os.getpid()
+
+        return hedge_multis.multi
 
-    def _get_curl_connection(self, url, proxies=None):
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is not None and self._executor_pid != os.getpid():
+                # Inherited from the parent process, along with its wake up socket
+                keep_inherited(self._executor)
+                self._executor = None
+
+            if self._executor is None:
+                self._executor = CURLExecutor(self, multi_factory=self._create_multi)
+                self._executor_pid = os.getpid()
+
+            return self._executor
+
+    def _get_curl_connection(self, url, proxies=None, tls_config=None):
         """Returns a new CURL connection to handle the request to a given URL.
 
         Args:
             url (str): the URL of the request being sent.
             proxies (dict, optional): A Requests-style dictionary of proxies used on this request.
+            tls_config (CURLTLSConfig, optional): Defaults to None. The TLS configuration
+                of the request. If not given, the default one.
 
         Returns:
             CURLConnectionPool: a connection pool that is capable of handling the given request.
         """
-        proxy_url = select_proxy(url, proxies)
+        # Without proxies there is no need to parse the URL to select one
+        proxy_url = select_proxy(url, proxies) if proxies else None
 
         if proxy_url:
-            pool = self._pool_provider.get_pool_for_proxied_url(proxy_url, url)
+            pool = self._pool_provider.get_pool_for_proxied_url(
+                proxy_url, url, tls_config=tls_config
+            )
         else:
-            pool = self._pool_provider.get_pool_for_url(url)
+            pool = self._pool_provider.get_pool_for_url(url, tls_config=tls_config)
 
         return pool
 
+    def stats(self):
+        """Returns a snapshot of the usage statistics of the connection pools of this adapter.
+
+        Returns:
+            dict: for every pool in use, by host key (such as "https://host:443"), a dict
+                with the number of `requests` started, `in_use` and `idle` handlers,
+                `empty_pool_errors` raised, `new_connections` opened and transfers that
+                `reused_connections`, and the `checkout_wait` histogram of the time spent
+                waiting for a handler to be available.
+        """
+        return self._pool_provider.stats()
+
     def close(self):
         """Cleans up adapter specific items."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            if self._executor_pid == os.getpid():
+                executor.shutdown(wait=True)
+            else:
+                # Inherited from the parent process, where it still runs
+                keep_inherited(executor)
+
+        # Multis of other threads are closed once their threads end
+        hedge_multis = self._hedge_multis
+        if getattr(hedge_multis, "pid", None) == os.getpid():
+            hedge_multis.multi.close()
+            del hedge_multis.multi, hedge_multis.pid
+
         self._pool_provider.clear()
+
+
+class _TimeoutBudget(object):
+    """The total timeout of a `send` call, shared by all of its attempts and the backoff
+    between them. The connect and read timeouts of each attempt are clipped to the time
+    left."""
+
+    def __init__(self, connect_timeout, read_timeout, total_timeout):
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._total_timeout = total_timeout
+        self._start = time.monotonic()
+        self._attempts = 0
+
+    @classmethod
+    def from_timeout(cls, timeout):
+        """Returns the budget of the given timeout, or None if it has no total."""
+        connect_timeout, read_timeout, total_timeout = split_timeout(timeout)
+
+        if total_timeout is None:
+            return None
+
+        return cls(connect_timeout, read_timeout, total_timeout)
+
+    @property
+    def remaining(self):
+        return self._total_timeout - (time.monotonic() - self._start)
+
+    def start_attempt(self):
+        """Returns the timeout of a new attempt, limited to the time left."""
+        self._attempts += 1
+        # Timeouts must be positive, the attempt then fails as soon as it starts
+        remaining = max(self.remaining, 0.001)
+
+        return Timeout(
+            connect=_clip_timeout(self._connect_timeout, remaining),
+            read=_clip_timeout(self._read_timeout, remaining),
+            total=remaining,
+        )
+
+    def has_time_for(self, sleep_time):
+        """Returns whether time would be left for another attempt after sleeping."""
+        return sleep_time < self.remaining
+
+    def sleep(self, backoff):
+        """Sleeps for the given backoff, unless no time would be left for another attempt.
+
+        Returns:
+            bool: whether there is time left for another attempt.
+        """
+        if not self.has_time_for(backoff):
+            return False
+
+        if backoff > 0:
+            time.sleep(backoff)
+
+        return True
+
+    def final_error(self, error):
+        """Returns a copy of the error that ends the call, telling the time it took."""
+        message = "{0} ({1:.3f}s of the {2}s total timeout used by {3} attempts)"
+        message = message.format(
+            error, time.monotonic() - self._start, self._total_timeout, self._attempts
+        )
+
+        return type(error)(message, request=error.request, response=error.response)
+
+
+def _get_retry_sleep_time(retries, response):
+    if retries.respect_retry_after_header:
+        try:
+            retry_after = retries.get_retry_after(response.raw)
+        except InvalidHeader:
+            retry_after = None  # Just like a missing header
+
+        if retry_after is not None:
+            return retry_after
+
+    return retries.get_backoff_time()
+
+
+def _clip_timeout(timeout, remaining):
+    # Without a timeout, the total one is enough
+    return None if timeout is None else min(timeout, remaining)
@@ -0,0 +1,336 @@
+"""Asyncio client, that runs CURL transfers from the event loop without threads"""
+
+import asyncio
+import pycurl
+
+from collections import deque
+
+from .adapter import CURLAdapter
+from .error import to_requests_exception
+from .multi import CURLMulti
+from .pool import EmptyPool
+from .stream import pop_chunks
+
+
+class AsyncCURLClient(object):
+    """Sends requests from an asyncio event loop, driving all the transfers with a single
+    `pycurl.CurlMulti`.
+
+    libcurl tells the client which sockets to watch, and when to time out, through the
+    pycurl.M_SOCKETFUNCTION and pycurl.M_TIMERFUNCTION callbacks. The sockets are then
+    watched by the event loop itself, so many concurrent transfers need no threads at all.
+
+    CURL handlers are taken from the pools of the given adapter, which also translates
+    the requests. When a pool is empty, the request waits for a handler to be given back.
+    Bodies of streamed responses keep up to `stream_buffer_size` bytes not read yet.
+
+    The client can only be used from a single event loop::
+
+        async with AsyncCURLClient() as client:
+            response = await client.send(prepared_request)
+    """
+
+    # Seconds between checks for free handlers, when they are given back by other clients
+    EMPTY_POOL_RETRY_INTERVAL = 0.05
+
+    def __init__(
+        self, adapter=None, stream_buffer_size=1024 * 1024, multi_factory=CURLMulti
+    ):
+        self._adapter = adapter if adapter is not None else CURLAdapter()
+        self._stream_buffer_size = stream_buffer_size
+        self._multi_factory = multi_factory
+        self._loop = None
+        self._multi = None
+        self._timer = None
+        self._handler_released = None
+        # Running transfers, with the future of their response and their streamed body
+        self._transfers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        """Sends a request, without blocking the event loop.
+
+        Args:
+            request (requests.PreparedRequest): the request to send.
+            stream (bool, optional): Defaults to False. Whether to return as soon as the
+                response headers are received. The body must then be read asynchronously
+                from `response.raw`, which is an `AsyncCURLStreamingBody`.
+            timeout (float or tuple, optional): Defaults to None. How long to wait for
+                the server, as a float, a (connect timeout, read timeout) tuple or an
+                `urllib3.util.Timeout`.
+            verify (bool or str, optional): Defaults to True. Whether to verify the server
+                TLS certificate, or the path of the CA bundle to use.
+            cert (str or tuple, optional): Defaults to None. The client certificate.
+            proxies (dict, optional): Defaults to None. The proxies dictionary to apply.
+
+        Raises:
+            requests.exceptions.RequestException: if the request failed.
+
+        Returns:
+            requests.Response: the response of the request.
+        """
+        self._bind_to_loop()
+
+        body = None
+        if stream:
+            body = AsyncCURLStreamingBody(self, self._stream_buffer_size)
+        transfer = await self._start_transfer(
+            request,
+            timeout=timeout,
+            verify=verify,
+            cert=cert,
+            proxies=proxies,
+            body=body,
+        )
+
+        if stream:
+            body.transfer = transfer
+
+        future = self._loop.create_future()
+        self._transfers[transfer] = (future, body)
+        self._multi.add_transfer(transfer)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._abort(transfer)
+            raise
+
+        return transfer.response.to_requests_response(raw=body)
+
+    async def _start_transfer(self, request, **kwargs):
+        while True:
+            try:
+                return self._adapter._start_curl_transfer(
+                    request, block=False, **kwargs
+                )
+            except EmptyPool:
+                self._handler_released.clear()
+
+            try:
+                # Handlers may also be given back from outside this client
+                await asyncio.wait_for(
+                    self._handler_released.wait(), self.EMPTY_POOL_RETRY_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def _bind_to_loop(self):
+        loop = asyncio.get_event_loop()
+
+        if self._multi is None:
+            self._loop = loop
+            self._handler_released = asyncio.Event()
+            self._multi = self._multi_factory()
+            self._multi.setopt(pycurl.M_SOCKETFUNCTION, self._on_socket_change)
+            self._multi.setopt(pycurl.M_TIMERFUNCTION, self._on_timer_change)
+        elif loop is not self._loop:
+            raise RuntimeError("AsyncCURLClient can only be used from one event loop")
+
+    def _on_socket_change(self, what, sock_fd, multi, socketp):
+        """Callback for pycurl.M_SOCKETFUNCTION, that watches the socket for the events
+        libcurl is interested in."""
+        self._loop.remove_reader(sock_fd)
+        self._loop.remove_writer(sock_fd)
+
+        if what in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            self._loop.add_reader(
+                sock_fd, self._on_socket_event, sock_fd, pycurl.CSELECT_IN
+            )
+
+        if what in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            self._loop.add_writer(
+                sock_fd, self._on_socket_event, sock_fd, pycurl.CSELECT_OUT
+            )
+
+    def _on_timer_change(self, timeout_ms):
+        """Callback for pycurl.M_TIMERFUNCTION, that schedules the next call to libcurl
+        for it to handle its timeouts. A negative timeout removes the timer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if timeout_ms >= 0:
+            self._timer = self._loop.call_later(
+                timeout_ms / 1000.0,
+                self._on_socket_event,
+                pycurl.SOCKET_TIMEOUT,
+                0,
+            )
+
+    def _on_socket_event(self, sock_fd, ev_bitmask):
+        if self._multi is None:
+            return
+
+        for transfer, curl_error in self._multi.socket_action(sock_fd, ev_bitmask):
+            self._complete(transfer, curl_error)
+
+        # Streamed responses are returned as soon as their headers are received
+        for transfer, (future, body) in list(self._transfers.items()):
+            if body is not None and not future.done() and transfer.headers_received:
+                transfer.update_response_info()
+                future.set_result(None)
+
+    def _complete(self, transfer, curl_error):
+        future, body = self._transfers.pop(transfer)
+
+        if curl_error is None:
+            transfer.finish()
+            error = None
+        else:
+            transfer.fail(curl_error)
+            error = to_requests_exception(curl_error, transfer.response.request)
+
+        self._handler_released.set()
+
+        if not future.done():
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+        if body is not None:
+            body.finish(error)
+
+    def _abort(self, transfer):
+        """Stops a transfer that has not completed yet, giving back its handler."""
+        if transfer in self._transfers:
+            del self._transfers[transfer]
+            self._multi.remove_transfer(transfer)
+            transfer.abort()
+            self._handler_released.set()
+
+    def close(self):
+        """Aborts all the transfers in progress, and releases the multi handler."""
+        if self._multi is None:
+            return
+
+        for transfer, (future, body) in list(self._transfers.items()):
+            self._abort(transfer)
+            future.cancel()
+            if body is not None:
+                body.finish(None)
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._multi.close()
+        self._multi = None
+
+
+class AsyncCURLStreamingBody(object):
+    """Response body of a streamed request sent by an `AsyncCURLClient`, that is read
+    asynchronously as it is received::
+
+        async for chunk in response.raw:
+            ...
+
+    When more than `max_buffer_size` bytes are received but not read yet, the transfer
+    is paused until the body is read, which keeps memory bounded.
+    """
+
+    def __init__(self, client, max_buffer_size=1024 * 1024):
+        self.transfer = None
+        self._client = client
+        self._max_buffer_size = max_buffer_size
+        self._chunks = deque()
+        self._buffered = 0
+        self._paused = False
+        self._data_received = asyncio.Event()
+        self._done = False
+        self._error = None
+        self._closed = False
+
+    def write(self, chunk):
+        """Callback for pycurl.WRITEFUNCTION, that keeps the received chunk until it is
+        read, or pauses the transfer if too much data is pending."""
+        if self._buffered >= self._max_buffer_size:
+            # libcurl delivers this very same chunk again once the transfer is resumed
+            self._paused = True
+            self.transfer.pause_read_timer()
+            return pycurl.WRITEFUNC_PAUSE
+
+        self._chunks.append(chunk)
+        self._buffered += len(chunk)
+        self._data_received.set()
+
+    def finish(self, error):
+        """Called once the transfer is over, with the error that made it fail, if any."""
+        self._done = True
+        self._error = error
+        self._data_received.set()
+
+    async def read(self, amt=None):
+        """Reads up to `amt` bytes of the body, or the whole remaining body if not given.
+        Returns an empty bytes string once the body was completely read.
+
+        Raises:
+            requests.exceptions.RequestException: if the transfer failed while receiving the body.
+        """
+        if amt is None:
+            # Read in bounded steps, so the transfer is not paused waiting for this read
+            data = []
+            chunk = await self.read(self._max_buffer_size)
+            while chunk:
+                data.append(chunk)
+                chunk = await self.read(self._max_buffer_size)
+            return b"".join(data)
+
+        await self._wait_until(lambda: self._chunks or self._done)
+
+        if not self._chunks and self._error is not None:
+            raise self._error
+
+        data = pop_chunks(self._chunks, amt)
+        self._buffered -= len(data)
+        self._resume()
+
+        return data
+
+    async def _wait_until(self, condition):
+        while not self._closed and not condition():
+            self._data_received.clear()
+            self._resume()
+            await self._data_received.wait()
+
+    def _resume(self):
+        if self._paused and self._buffered < self._max_buffer_size:
+            self._paused = False
+            self.transfer.resume_read_timer()
+            self.transfer.curl_handler.pause(pycurl.PAUSE_CONT)
+
+    def seekable(self):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.read(self._max_buffer_size)
+        if not chunk:
+            raise StopAsyncIteration
+        return chunk
+
+    @property
+    def closed(self):
+        return self._closed or (self._done and not self._chunks)
+
+    def close(self):
+        """Closes the body, aborting the transfer if it was not completed yet."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._chunks.clear()
+        self._data_received.set()
+
+        if not self._done:
+            self._client._abort(self.transfer)
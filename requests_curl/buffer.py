@@ -0,0 +1,93 @@
+"""Receive buffers for response bodies kept in memory"""
+
+import io
+import tempfile
+
+
+class CURLReceiveBuffer(object):
+    """Write-only file-like object that keeps a response body in memory.
+
+    The buffer can be sized up front with `reserve`, for example from the Content-Length
+    header, so the body is received without reallocating the buffer as it grows. Once
+    complete, `getvalue` hands the buffer over as the body, without copying it.
+
+    With a `spool_size`, bodies larger than it are moved to a temporary file while they
+    are received, just like `tempfile.SpooledTemporaryFile` does.
+    """
+
+    # Largest size reserved up front, no matter the expected size of the body
+    MAX_RESERVED_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, spool_size=None):
+        self._buffer = io.BytesIO()
+        self._spool_size = spool_size
+        self._spooled = False
+
+    @property
+    def spooled(self):
+        """Whether the body was moved to a temporary file"""
+        return self._spooled
+
+    def reserve(self, size):
+        """Makes room for a body of the given size, if nothing was received yet."""
+        if self._spooled or self._buffer.tell() != 0 or size <= 0:
+            return
+
+        if self._spool_size is not None and size > self._spool_size:
+            self._spool()
+        else:
+            # BytesIO takes ownership of the zero-filled bytes, and writes over them
+            # in place, as long as no one else references them
+            self._buffer = io.BytesIO(bytes(min(size, self.MAX_RESERVED_SIZE)))
+
+    def write(self, chunk):
+        """Callback for pycurl.WRITEFUNCTION, that appends the received chunk."""
+        if (
+            self._spool_size is not None
+            and not self._spooled
+            and self._buffer.tell() + len(chunk) > self._spool_size
+        ):
+            self._spool()
+
+        self._buffer.write(chunk)
+
+    def _spool(self):
+        spooled_buffer = tempfile.TemporaryFile()
+        spooled_buffer.write(self.getvalue())
+
+        self._buffer = spooled_buffer
+        self._spooled = True
+
+    def __len__(self):
+        """Returns the size of the body received so far"""
+        return self._buffer.tell()
+
+    def seekable(self):
+        return False
+
+    def getvalue(self):
+        """Returns the whole body received.
+
+        Returns:
+            bytes: the body.
+        """
+        if self._spooled:
+            self._buffer.seek(0)
+            return self._buffer.read()
+
+        # Drops the reserved space that was not used
+        self._buffer.truncate()
+        return self._buffer.getvalue()
+
+    def to_file(self):
+        """Returns a file object to read the whole body received from. A temporary file
+        holding the body is handed over, and deleted once closed.
+
+        Returns:
+            file-like: the body, positioned at its start.
+        """
+        if not self._spooled:
+            return io.BytesIO(self.getvalue())
+
+        self._buffer.seek(0)
+        return self._buffer
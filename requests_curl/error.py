@@ -5,10 +5,16 @@ from requests.exceptions import (
     ConnectionError,
     ConnectTimeout,
     ReadTimeout,
+    RequestException,
     SSLError,
     ProxyError,
 )
 
+
+class ResponseBodyTooLarge(RequestException):
+    """The response body is larger than the maximum size allowed."""
+
+
 _PYCURL_SSL_ERRORS = {
     pycurl.E_SSL_CACERT,
     pycurl.E_SSL_CACERT_BADFILE,
@@ -29,6 +35,16 @@ _PYCURL_SSL_ERRORS = {
 
 _PYCURL_TIMEOUT_ERRORS = {pycurl.E_OPERATION_TIMEOUTED, pycurl.E_OPERATION_TIMEDOUT}
 
+# The read timer of a transfer is the only callback that aborts it
+_PYCURL_READ_TIMEOUT_ERRORS = {pycurl.E_ABORTED_BY_CALLBACK}
+
+
+# Timeouts while the connection was being established. Any other timeout, of the read
+# timeout (a transfer that stalled) or of the total one, is a read timeout
+_CONNECT_TIMEOUT_ERR_PATTERN = re.compile(
+    r"(Connection|Resolving) timed out|Failed to connect"
+)
+
 
 _PROXY_AUTH_ERR_PATTERN = re.compile(
     r"Received HTTP code \d{3} from proxy after CONNECT"
@@ -51,14 +67,27 @@ def _to_proxy_error(error_code, error_msg):
 
 
 def _to_timeout_error(error_code, error_msg):
+    if error_code in _PYCURL_READ_TIMEOUT_ERRORS:
+        return ReadTimeout
+
     if error_code in _PYCURL_TIMEOUT_ERRORS:
-        if error_msg.startswith("Connection timed out"):
+        if _CONNECT_TIMEOUT_ERR_PATTERN.match(error_msg) is not None:
             return ConnectTimeout
         else:
             return ReadTimeout
 
 
-_ERROR_TRANSLATE_FUNCS = (_to_ssl_error, _to_proxy_error, _to_timeout_error)
+def _to_body_size_error(error_code, error_msg):
+    if error_code == pycurl.E_FILESIZE_EXCEEDED:
+        return ResponseBodyTooLarge
+
+
+_ERROR_TRANSLATE_FUNCS = (
+    _to_ssl_error,
+    _to_proxy_error,
+    _to_timeout_error,
+    _to_body_size_error,
+)
 
 
 def translate_curl_exception(curl_exception):
@@ -82,3 +111,17 @@ def translate_curl_exception(curl_exception):
             return requests_error
 
     return default_error
+
+
+def to_requests_exception(curl_exception, request=None):
+    """Builds the requests exception that matches a given PyCURL error.
+
+    Args:
+        curl_exception (pycurl.error): PyCURL error to be translated.
+        request (PreparedRequest, optional): Defaults to None. The request that failed.
+
+    Returns:
+        requests.exceptions.RequestException: an instance of the translated exception.
+    """
+    requests_error = translate_curl_exception(curl_exception)
+    return requests_error("CURL error {0}".format(curl_exception.args), request=request)
@@ -0,0 +1,202 @@
+"""Executor that sends requests from a single background thread"""
+
+import socket
+import threading
+
+from collections import deque
+from concurrent.futures import Future
+
+from .error import to_requests_exception
+from .multi import CURLMulti
+from .pool import EmptyPool
+
+
+class CURLExecutor(object):
+    """Sends requests concurrently from a single background thread, that drives all the
+    transfers with a `pycurl.CurlMulti`. Requests can be submitted from any thread, and
+    their responses are delivered through `concurrent.futures.Future` objects::
+
+        with CURLExecutor(CURLAdapter()) as executor:
+            futures = [executor.submit(request) for request in prepared_requests]
+            responses = [future.result() for future in futures]
+
+    CURL handlers are taken from the pools of the given adapter, which also translates
+    the requests. Requests wait in the background thread for a free handler when their
+    pool is empty. Just like `CURLAdapter.send_many`, failed requests are not retried.
+    """
+
+    # Seconds between checks for free handlers, when requests are waiting for one
+    EMPTY_POOL_RETRY_INTERVAL = 0.05
+
+    def __init__(self, adapter, multi_factory=CURLMulti):
+        self._adapter = adapter
+        self._multi_factory = multi_factory
+        self._lock = threading.Lock()
+        self._submitted = deque()
+        self._shutdown = False
+        self._thread = None
+        # Writing to this socket wakes up the background thread
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(wait=True)
+
+    def submit(self, request, **send_kwargs):
+        """Schedules a request to be sent from the background thread.
+
+        Args:
+            request (requests.PreparedRequest): the request to send.
+            **send_kwargs: the `timeout`, `verify`, `cert` and `proxies` arguments of
+                `CURLAdapter.send`. Responses are always received completely, so `stream`
+                is ignored. The `curl_request` already built for the request can also
+                be given.
+
+        Raises:
+            RuntimeError: if the executor was shut down.
+
+        Returns:
+            concurrent.futures.Future: the future `requests.Response`. If the request fails,
+                its exception is a `requests.exceptions.RequestException`.
+        """
+        send_kwargs.pop("stream", None)
+        future = Future()
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit requests after shutdown")
+
+            self._submitted.append((future, request, send_kwargs))
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="CURLExecutor", daemon=True
+                )
+                self._thread.start()
+
+        self._wakeup()
+
+        return future
+
+    def shutdown(self, wait=True):
+        """Stops accepting requests. The background thread exits once all the requests
+        already submitted are completed.
+
+        Args:
+            wait (bool, optional): Defaults to True. Whether to wait for the background
+                thread to exit.
+        """
+        with self._lock:
+            self._shutdown = True
+            thread = self._thread
+
+        if thread is None:
+            self._close_wakeup()
+            return
+
+        self._wakeup()
+
+        if wait:
+            thread.join()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            # Either there are enough pending wake ups, or the executor was closed
+            pass
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _close_wakeup(self):
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def _run(self):
+        multi = self._multi_factory()
+        # Requests waiting for a free handler, and transfers in progress
+        waiting = deque()
+        running = {}
+        error = None
+
+        try:
+            while True:
+                with self._lock:
+                    submitted = list(self._submitted)
+                    self._submitted.clear()
+                    shutdown = self._shutdown
+
+                for future, request, send_kwargs in submitted:
+                    if future.set_running_or_notify_cancel():
+                        waiting.append((future, request, send_kwargs))
+
+                self._start_transfers(multi, waiting, running)
+
+                for transfer, curl_error in multi.perform():
+                    self._complete(transfer, curl_error, running.pop(transfer))
+
+                if shutdown and not waiting and not running:
+                    break
+
+                timeout = self.EMPTY_POOL_RETRY_INTERVAL if waiting else 1.0
+                multi.wait(timeout, wakeup_fd=self._wakeup_reader.fileno())
+                self._drain_wakeups()
+
+        except Exception as unexpected_error:
+            error = unexpected_error
+            raise
+
+        finally:
+            multi.close()
+
+            with self._lock:
+                self._shutdown = True
+                waiting.extend(self._submitted)
+                self._submitted.clear()
+
+            futures = [future for future, _, _ in waiting] + list(running.values())
+
+            for future in futures:
+                if not future.done():
+                    future.set_exception(
+                        error or RuntimeError("the executor was shut down")
+                    )
+
+            self._close_wakeup()
+
+    def _start_transfers(self, multi, waiting, running):
+        for _ in range(len(waiting)):
+            future, request, send_kwargs = waiting.popleft()
+
+            try:
+                transfer = self._adapter._start_curl_transfer(
+                    request, block=False, **send_kwargs
+                )
+            except EmptyPool:
+                waiting.append((future, request, send_kwargs))
+                continue
+            except Exception as error:
+                future.set_exception(error)
+                continue
+
+            running[transfer] = future
+            multi.add_transfer(transfer)
+
+    def _complete(self, transfer, curl_error, future):
+        if curl_error is None:
+            transfer.finish()
+            future.set_result(transfer.response.to_requests_response())
+        else:
+            transfer.fail(curl_error)
+            future.set_exception(
+                to_requests_exception(curl_error, transfer.response.request)
+            )
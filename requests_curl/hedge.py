@@ -0,0 +1,139 @@
+"""Hedging of slow requests, by sending a second copy of them"""
+
+import math
+import threading
+
+from collections import deque
+
+# Number of host keys whose latencies are kept
+_MAX_HOST_KEYS = 1024
+
+
+class CURLHedgePolicy(object):
+    """Decides which requests `CURLAdapter.send` hedges, and when: if a request has no
+    response after the hedging delay, a second copy of it is sent on another handler of
+    the same pool. The first copy to complete wins, and the other one is aborted, giving
+    its handler back to the pool.
+
+    Only idempotent requests without a body are hedged, GET and HEAD ones by default.
+    The delay is either fixed, or the given percentile of the latencies of the last
+    `window_size` requests to the same host key. Requests are not hedged until
+    `min_samples` latencies were seen for their host key. Each hedged request costs an
+    extra one, so hedging after the 95th percentile sends about 5% more requests.
+
+    The policy is thread-safe, and can be shared by many adapters.
+    """
+
+    def __init__(
+        self,
+        delay=None,
+        percentile=95,
+        window_size=100,
+        min_samples=20,
+        methods=("GET", "HEAD"),
+    ):
+        """Initializes the policy.
+
+        Args:
+            delay (float, optional): Defaults to None. Seconds to wait for a response
+                before hedging. If not given, the delay follows the latencies seen.
+            percentile (float, optional): Defaults to 95. Percentile of the latencies
+                seen used as delay, between 0 (excluded) and 100.
+            window_size (int, optional): Defaults to 100. Number of latencies kept for
+                each host key.
+            min_samples (int, optional): Defaults to 20. Number of latencies needed to
+                hedge requests, at most `window_size`.
+            methods (iterable, optional): Defaults to ("GET", "HEAD"). The methods of
+                the requests that can be hedged, which must be idempotent.
+
+        Raises:
+            ValueError: if any of the arguments is out of range.
+        """
+        if delay is not None and delay < 0:
+            raise ValueError("delay can't be negative, got {0}".format(delay))
+
+        if not 0 < percentile <= 100:
+            raise ValueError(
+                "percentile must be between 0 and 100, got {0}".format(percentile)
+            )
+
+        if not 1 <= min_samples <= window_size:
+            raise ValueError(
+                "min_samples must be between 1 and window_size, got {0}".format(
+                    min_samples
+                )
+            )
+
+        self._delay = delay
+        self._percentile = percentile
+        self._window_size = window_size
+        self._min_samples = min_samples
+        self._methods = frozenset(method.upper() for method in methods)
+
+        self._lock = threading.Lock()
+        # Latencies of the last requests, by host key
+        self._latencies = {}
+        self._requests = 0
+        self._hedged_requests = 0
+        self._hedges_won = 0
+
+    def applies_to(self, request):
+        """Returns whether the given `requests.PreparedRequest` can be hedged."""
+        return request.method in self._methods and not request.body
+
+    def get_delay(self, host_key):
+        """Returns the seconds to wait for a response before hedging a request to the
+        given host key, or None if the request must not be hedged."""
+        if self._delay is not None:
+            return self._delay
+
+        with self._lock:
+            latencies = self._latencies.get(host_key)
+            if latencies is None or len(latencies) < self._min_samples:
+                return None
+
+            latencies = sorted(latencies)
+
+        rank = int(math.ceil(self._percentile / 100.0 * len(latencies)))
+        return latencies[rank - 1]
+
+    def record_response(self, host_key, transfer_info, hedged=False, hedge_won=False):
+        """Accounts the response to a request that could be hedged.
+
+        Args:
+            host_key (str): the host key of the pool the request was sent by.
+            transfer_info (CURLTransferInfo): the timings of the transfer that won.
+            hedged (bool, optional): Defaults to False. Whether a second copy was sent.
+            hedge_won (bool, optional): Defaults to False. Whether the second copy won.
+        """
+        with self._lock:
+            self._requests += 1
+            self._hedged_requests += hedged
+            self._hedges_won += hedge_won
+
+            if self._delay is not None or transfer_info is None:
+                return  # Latencies are only needed to compute the delay
+
+            latencies = self._latencies.get(host_key)
+            if latencies is None:
+                # Dropping every host key is enough to bound them, as few are in use
+                if len(self._latencies) >= _MAX_HOST_KEYS:
+                    self._latencies.clear()
+
+                latencies = self._latencies[host_key] = deque(maxlen=self._window_size)
+
+            latencies.append(transfer_info.total_time)
+
+    def stats(self):
+        """Returns a snapshot of the usage statistics of the policy.
+
+        Returns:
+            dict: with the number of `requests` that could be hedged, the number of them
+                actually `hedged`, and the number of `hedges_won` by the second copy.
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedged": self._hedged_requests,
+                "hedges_won": self._hedges_won,
+            }
@@ -0,0 +1,125 @@
+"""Concurrent CURL transfers driven by a single pycurl.CurlMulti"""
+
+import pycurl
+import select
+
+
+class CURLMulti(object):
+    """Runs many CURL transfers concurrently, from a single thread, on top of a `pycurl.CurlMulti`."""
+
+    def __init__(self, multi_factory=pycurl.CurlMulti):
+        self._multi = multi_factory()
+        self._transfers = {}
+
+    def __len__(self):
+        """Returns the number of transfers currently in progress"""
+        return len(self._transfers)
+
+    def add_transfer(self, transfer):
+        """Starts driving the given transfer.
+
+        Args:
+            transfer (CURLTransfer): a configured transfer that has not been performed yet.
+        """
+        self._transfers[transfer.curl_handler] = transfer
+        self._multi.add_handle(transfer.curl_handler)
+
+    def remove_transfer(self, transfer):
+        """Stops driving the given transfer, even if it has not completed yet.
+
+        Args:
+            transfer (CURLTransfer): a transfer previously added to this multi.
+        """
+        self._multi.remove_handle(transfer.curl_handler)
+        del self._transfers[transfer.curl_handler]
+
+    def perform(self):
+        """Drives all the transfers as far as possible without waiting for network activity.
+
+        Completed transfers are removed from this multi, but their handlers are not given back
+        to the pool. That is responsibility of the caller, by either finishing or aborting them.
+
+        Returns:
+            list: a list of `(CURLTransfer, pycurl.error)` tuples, one for every completed
+                transfer. The error is None if the transfer succeeded.
+        """
+        while True:
+            ret, _ = self._multi.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+
+        return self._read_completed()
+
+    def setopt(self, option, value):
+        """Sets an option of the underlying multi handler, such as pycurl.M_SOCKETFUNCTION."""
+        self._multi.setopt(option, value)
+
+    def socket_action(self, sock_fd, ev_bitmask):
+        """Drives the transfers using the given socket, when the multi is run by an event
+        loop, through the pycurl.M_SOCKETFUNCTION and pycurl.M_TIMERFUNCTION callbacks.
+
+        Args:
+            sock_fd (int): the socket with network activity, or pycurl.SOCKET_TIMEOUT
+                when called because the timeout set by libcurl expired.
+            ev_bitmask (int): the pycurl.CSELECT_IN and pycurl.CSELECT_OUT events of the
+                socket, or 0 to let libcurl find them out.
+
+        Returns:
+            list: the completed transfers, just like `perform`.
+        """
+        self._multi.socket_action(sock_fd, ev_bitmask)
+        return self._read_completed()
+
+    def _read_completed(self):
+        completed = []
+
+        while True:
+            queued, succeeded, failed = self._multi.info_read()
+
+            for curl_handler in succeeded:
+                completed.append((self._pop_transfer(curl_handler), None))
+
+            for curl_handler, error_code, error_msg in failed:
+                curl_error = pycurl.error(error_code, error_msg)
+                completed.append((self._pop_transfer(curl_handler), curl_error))
+
+            if not queued:
+                break
+
+        return completed
+
+    def wait(self, timeout=1.0, wakeup_fd=None):
+        """Waits until there is network activity for any of the transfers, or until libcurl
+        needs to be called again to handle its timeouts.
+
+        Args:
+            timeout (float, optional): Defaults to 1.0. Maximum amount of seconds to wait.
+            wakeup_fd (int, optional): Defaults to None. A file descriptor that also stops
+                the wait when it is readable, so other threads can interrupt it.
+        """
+        curl_timeout = self._multi.timeout()
+        if curl_timeout >= 0:
+            timeout = min(timeout, curl_timeout / 1000.0)
+
+        if wakeup_fd is None:
+            self._multi.select(timeout)
+            return
+
+        read_fds, write_fds, except_fds = self._multi.fdset()
+        select.select(read_fds + [wakeup_fd], write_fds, except_fds, timeout)
+
+    def _pop_transfer(self, curl_handler):
+        self._multi.remove_handle(curl_handler)
+        return self._transfers.pop(curl_handler)
+
+    def abort_transfers(self):
+        """Aborts all transfers in progress, giving their handlers back to their pools.
+        The multi can still be used, keeping the connections it opened alive."""
+        for transfer in list(self._transfers.values()):
+            self.remove_transfer(transfer)
+            transfer.abort()
+
+    def close(self):
+        """Aborts all transfers in progress and closes the underlying multi handler."""
+        self.abort_transfers()
+        self._multi.close()
@@ -1,8 +1,42 @@
+import bisect
+import os
 import pycurl
+import six
+import threading
+import time
 
 from six.moves import queue, range
+from urllib3.util import parse_url
 
-from .response import CURLResponse
+from .request import CURLReadTimer
+from .response import CURLResponse, CURLTransferInfo
+
+# Errors after which the connection state of a handler can't be trusted anymore
+_BROKEN_HANDLER_ERRORS = {
+    pycurl.E_COULDNT_CONNECT,
+    pycurl.E_GOT_NOTHING,
+    pycurl.E_HTTP2,
+    pycurl.E_OPERATION_TIMEDOUT,
+    pycurl.E_PARTIAL_FILE,
+    pycurl.E_RECV_ERROR,
+    pycurl.E_SEND_ERROR,
+    pycurl.E_SSL_CONNECT_ERROR,
+}
+
+
+# Objects inherited from the parent process, which are never released: closing their CURL
+# handlers would shut down the connections that the parent process still uses
+_inherited_objects = []
+
+
+def keep_inherited(*objects):
+    """Keeps objects inherited from the parent process, after a fork, from ever being
+    released. They must not be used by the child process either.
+
+    Args:
+        *objects: the inherited objects.
+    """
+    _inherited_objects.extend(objects)
 
 
 class PoolException(Exception):
@@ -18,22 +52,64 @@ class ClosedPool(PoolException):
 
 
 class CURLHandlerPool(object):
-    """Thread-safe connection pool for one host. Tries to emulate HTTPConnectionPool."""
+    """Thread-safe connection pool for one host. Tries to emulate HTTPConnectionPool.
+
+    CURL handlers are created on demand, up to `maxsize`, and reused in LIFO order. The
+    `warm_size` keyword argument allows creating some of them up front, for hot hosts.
+
+    Pools are fork-safe: the handlers a child process inherits, and the connections they
+    keep, are left to the parent process. The child process creates its own handlers,
+    and warms them again, the first time it uses the pool.
+    """
 
     def __init__(self, curl_factory=pycurl.Curl, maxsize=1, **kwargs):
         self._block = kwargs.get("block", False)
+        self._host_key = kwargs.get("host_key")
+        self._stats = CURLPoolStats()
+        self._curl_factory = curl_factory
+        self._maxsize = maxsize
         self._pool = queue.LifoQueue(maxsize)
+        self._handlers_count = 0
+        self._handlers_count_lock = threading.Lock()
+        # Options currently set on each handler, to only set the ones that change
+        self._applied_options = {}
+        # Process that created the handlers of the pool
+        self._pid = os.getpid()
+
+        self._warm_size = min(kwargs.get("warm_size", 0), maxsize)
+        self._warm()
+
+    def _warm(self):
+        for _ in range(self._warm_size):
+            self._pool.put(self._create_handler(), block=False)
+
+    def _check_fork(self):
+        """Drops the handlers inherited from the parent process, if the pool is used
+        from a child process for the first time."""
+        if self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        keep_inherited(self._pool, self._applied_options)
+        self._applied_options = {}
+        self._stats = CURLPoolStats()
+
+        if self._pool is None:
+            return  # Pool was closed
 
-        for _ in range(maxsize):
-            handler = curl_factory()
-            self._pool.put(handler, block=False)
+        self._pool = queue.LifoQueue(self._maxsize)
+        self._handlers_count = 0
+        self._handlers_count_lock = threading.Lock()
+        self._warm()
 
-    def send(self, curl_request):
+    def send(self, curl_request, body=None):
         """Performs a CURL request of the given CURLRequest instance, and returns
         an appropiate response.
 
         Args:
             curl_request (CURLRequest): an instance of a given CURL request.
+            body (file-like, optional): Defaults to None. Where to write the body of the
+                response. If not given, the body is kept in memory.
 
         Returns:
             CURLResponse: the response of the request.
@@ -43,44 +119,109 @@ class CURLHandlerPool(object):
             EmptyPool: if there are no more connections available to perform the request.
         """
 
-        curl_handler = self.get_handler_from_pool()
+        with self.start_transfer(curl_request, body=body) as transfer:
+            transfer.curl_handler.perform()
 
-        response = CURLResponse(curl_request)
+        return transfer.response
 
-        curl_options = curl_request.options
-        curl_options.update(_get_curl_options_for_response(response))
-        curl_options.update(self.get_additional_curl_options())
-        for option, value in curl_options.items():
-            curl_handler.setopt(option, value)
+    def start_transfer(self, curl_request, block=None, body=None):
+        """Takes a handler from the pool and configures it to perform the given request,
+        without performing it. This allows the transfer to be driven by someone else,
+        for example a `pycurl.CurlMulti`.
 
-        curl_handler.perform()
+        Args:
+            curl_request (CURLRequest): an instance of a given CURL request.
+            block (bool, optional): Defaults to None. Overrides the blocking behaviour
+                of the pool when no handler is available.
+            body (file-like, optional): Defaults to None. Where to write the body of the
+                response. If not given, the body is kept in memory.
 
-        response.http_code = curl_handler.getinfo(pycurl.HTTP_CODE)
+        Returns:
+            CURLTransfer: the configured transfer, ready to be performed. It can be used as
+                a context manager, that always gives the handler back to the pool.
 
-        self.put_handler_back(curl_handler)
+        Raises:
+            EmptyPool: if there are no more connections available to perform the request.
+        """
+        curl_handler = self.get_handler_from_pool(block=block)
+        self._stats.record_request()
 
-        return response
+        response = CURLResponse(curl_request, body=body)
+        read_timeout = curl_request.read_timeout
+        read_timer = CURLReadTimer(read_timeout) if read_timeout else None
+        transfer = CURLTransfer(self, curl_handler, response, read_timer=read_timer)
+
+        try:
+            curl_options = dict(curl_request.options)
+            curl_options.update(_get_curl_options_for_response(response))
+            if read_timer is not None:
+                curl_options.update(read_timer.get_curl_options(response))
+            curl_options.update(self.get_additional_curl_options())
+            self._apply_options(curl_handler, curl_options)
+
+        except BaseException as error:
+            transfer.fail(error)
+            raise
+
+        return transfer
+
+    def _apply_options(self, curl_handler, curl_options):
+        """Configures the handler with the given options, only setting the ones that differ
+        from the options it already has. The handler is only reset when some of its options
+        must be cleared."""
+        applied_options = self._applied_options.pop(curl_handler, None)
+
+        must_reset = applied_options is None or any(
+            option not in curl_options for option in applied_options
+        )
+        if must_reset:
+            curl_handler.reset()
+            applied_options = {}
+
+        for option, value in curl_options.items():
+            if option not in applied_options or applied_options[option] != value:
+                curl_handler.setopt(option, value)
+
+        # Only recorded once all options were set, so a failure forces a reset next time
+        self._applied_options[curl_handler] = curl_options
 
     def get_additional_curl_options(self):
         return {}
 
-    def get_handler_from_pool(self):
+    def get_handler_from_pool(self, block=None):
         """Get a CURL handler. Will return a pooled handler if one is available.
 
+        Args:
+            block (bool, optional): Defaults to None. Whether to wait for a handler to be
+                available. If None, the pool blocking behaviour is used.
+
         Returns:
             pycurl.Curl: CURL handler, if available.
 
         Raises:
             EmptyPool: if the pool is empty and there are no more free handlers available.
         """
+        if block is None:
+            block = self._block
+
+        self._check_fork()
+        checkout_start = time.monotonic()
 
         try:
-            curl_handler = self._pool.get(block=self._block)
-            curl_handler.reset()
+            try:
+                curl_handler = self._pool.get(block=False)
+            except queue.Empty:
+                curl_handler = self._create_handler()
+                if curl_handler is None:
+                    # Pool reached its maximum size, so we wait for a handler to be put back
+                    curl_handler = self._pool.get(block=block)
+
+            self._stats.record_checkout_wait(time.monotonic() - checkout_start)
 
             return curl_handler
 
         except queue.Empty:
+            self._stats.record_empty_pool()
             raise EmptyPool(
                 "Pool reached maximum size and no more connections are allowed."
             )
@@ -88,6 +229,25 @@ class CURLHandlerPool(object):
         except AttributeError:
             raise ClosedPool("Pool is no longer available")
 
+    def _create_handler(self):
+        """Creates a new CURL handler, unless the pool reached its maximum size.
+
+        Returns:
+            pycurl.Curl: the new handler, or None if no more handlers are allowed.
+        """
+        with self._handlers_count_lock:
+            if self._handlers_count >= self._maxsize:
+                return None
+
+            self._handlers_count += 1
+
+        try:
+            return self._curl_factory()
+        except Exception:
+            with self._handlers_count_lock:
+                self._handlers_count -= 1
+            raise
+
     def put_handler_back(self, curl_handler):
         """Put a curl handler back into the pool.
 
@@ -98,17 +258,72 @@ class CURLHandlerPool(object):
             self._pool.put(curl_handler, block=False)
 
         except AttributeError:
-            pass  # Pool was closed
+            # Pool was closed, so the handler is no longer needed
+            curl_handler.close()
+
+    def replace_handler(self, curl_handler):
+        """Closes a handler that can't be reused, and puts a new one into the pool
+        in its place, so the capacity of the pool is kept.
+
+        Args:
+            curl_handler (pycurl.Curl:): the handler to be replaced.
+        """
+        self._applied_options.pop(curl_handler, None)
+        curl_handler.close()
+
+        if self._pool is None:
+            return  # Pool was closed
+
+        try:
+            new_curl_handler = self._curl_factory()
+        except Exception:
+            # The handler will be created again on demand
+            with self._handlers_count_lock:
+                self._handlers_count -= 1
+            raise
+
+        self.put_handler_back(new_curl_handler)
+
+    def record_transfer(self, transfer_info):
+        """Accounts a completed transfer in the statistics of this pool.
+
+        Args:
+            transfer_info (CURLTransferInfo): the timings of the transfer.
+        """
+        self._stats.record_transfer(transfer_info)
+
+    @property
+    def host_key(self):
+        return self._host_key
+
+    @property
+    def open(self):
+        return self._pool is not None
+
+    def stats(self):
+        """Returns a snapshot of the usage statistics of this pool.
+
+        Returns:
+            dict: the statistics, see `CURLPoolStats.snapshot`.
+        """
+        self._check_fork()
+        pool = self._pool
+        idle = pool.qsize() if pool is not None else 0
+        in_use = max(self._handlers_count - idle, 0)
+
+        return self._stats.snapshot(in_use=in_use, idle=idle)
 
     def close(self):
         """Close all pooled connections and disable the pool."""
         # This is almost identical to the HTTPConnectionPool.close implementation
+        self._check_fork()
 
         if self._pool is None:
             return
 
         # Disable access to the pool
         old_pool, self._pool = self._pool, None
+        self._applied_options = {}
 
         try:
             while True:
@@ -119,21 +334,185 @@ class CURLHandlerPool(object):
             pass  # Done.
 
 
+class CURLPoolStats(object):
+    """Thread-safe usage counters of a CURLHandlerPool. They are cheap to update, so they
+    are always collected."""
+
+    # Upper bounds, in seconds, of the buckets of the checkout wait histogram
+    CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._empty_pool_errors = 0
+        self._new_connections = 0
+        self._reused_connections = 0
+        self._checkout_waits = 0
+        self._checkout_wait_total = 0.0
+        self._checkout_wait_buckets = [0] * (len(self.CHECKOUT_WAIT_BUCKETS) + 1)
+
+    def record_request(self):
+        with self._lock:
+            self._requests += 1
+
+    def record_empty_pool(self):
+        with self._lock:
+            self._empty_pool_errors += 1
+
+    def record_checkout_wait(self, wait_time):
+        bucket = bisect.bisect_left(self.CHECKOUT_WAIT_BUCKETS, wait_time)
+
+        with self._lock:
+            self._checkout_waits += 1
+            self._checkout_wait_total += wait_time
+            self._checkout_wait_buckets[bucket] += 1
+
+    def record_transfer(self, transfer_info):
+        with self._lock:
+            if transfer_info.connection_reused:
+                self._reused_connections += 1
+            else:
+                self._new_connections += transfer_info.num_connects
+
+    def snapshot(self, in_use, idle):
+        """Returns the current value of the counters.
+
+        Args:
+            in_use (int): the number of handlers currently taken from the pool.
+            idle (int): the number of handlers available in the pool.
+
+        Returns:
+            dict: with the number of `requests` started, `in_use` and `idle` handlers,
+                `empty_pool_errors` raised, `new_connections` opened and transfers that
+                `reused_connections`, and the `checkout_wait` histogram of the time spent
+                waiting for a handler to be available. The histogram has the `count` and
+                `total` time of the waits, and `buckets`, a list of `(upper_bound, count)`
+                tuples, the last bound being infinite.
+        """
+        with self._lock:
+            bounds = self.CHECKOUT_WAIT_BUCKETS + (float("inf"),)
+
+            return {
+                "requests": self._requests,
+                "in_use": in_use,
+                "idle": idle,
+                "empty_pool_errors": self._empty_pool_errors,
+                "new_connections": self._new_connections,
+                "reused_connections": self._reused_connections,
+                "checkout_wait": {
+                    "count": self._checkout_waits,
+                    "total": self._checkout_wait_total,
+                    "buckets": list(zip(bounds, self._checkout_wait_buckets)),
+                },
+            }
+
+
+class CURLTransfer(object):
+    """A configured CURL handler, taken from a pool, together with the response
+    that is being filled by it."""
+
+    def __init__(self, pool, curl_handler, response, read_timer=None):
+        self.pool = pool
+        self.curl_handler = curl_handler
+        self.response = response
+        self.read_timer = read_timer
+        self._released = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_value is None:
+            self.finish()
+        else:
+            self.fail(exc_value)
+
+    def finish(self):
+        """Completes a performed transfer, putting the handler back into its pool.
+
+        Returns:
+            CURLResponse: the response of the request.
+        """
+        if not self._released:
+            self.update_response_info()
+            self.pool.record_transfer(self.response.transfer_info)
+            self._release()
+
+        return self.response
+
+    @property
+    def headers_received(self):
+        """Whether the headers of the final response were received. Informational
+        responses (such as 100 Continue) are followed by the final one."""
+        if not self.response.headers_complete:
+            return False
+
+        return self.curl_handler.getinfo(pycurl.HTTP_CODE) >= 200
+
+    def update_response_info(self):
+        """Sets the status code and timings reported by the handler on the response."""
+        self.response.http_code = self.curl_handler.getinfo(pycurl.HTTP_CODE)
+        self.response.transfer_info = CURLTransferInfo.from_curl_handler(
+            self.curl_handler
+        )
+
+    def pause_read_timer(self):
+        """Stops the read timeout while the transfer waits for its body to be read."""
+        if self.read_timer is not None:
+            self.read_timer.pause()
+
+    def resume_read_timer(self):
+        """Restarts the read timeout, once the transfer no longer waits for its body to
+        be read."""
+        if self.read_timer is not None:
+            self.read_timer.resume()
+
+    def abort(self):
+        """Gives back the handler of a transfer that did not complete."""
+        if not self._released:
+            self._release()
+
+    def fail(self, error):
+        """Gives back the handler of a transfer that failed with the given error. If the
+        error leaves the handler in an unknown state, it is replaced by a new one.
+
+        Args:
+            error (Exception): the error that made the transfer fail.
+        """
+        if self._released:
+            return
+
+        if _is_handler_broken(error):
+            self._released = True
+            self.pool.replace_handler(self.curl_handler)
+        else:
+            self._release()
+
+    def _release(self):
+        self._released = True
+        self.pool.put_handler_back(self.curl_handler)
+
+
 class ProxyCURLHandlerPool(CURLHandlerPool):
     def __init__(self, proxy_url, maxsize=1, **kwargs):
         super(ProxyCURLHandlerPool, self).__init__(maxsize=maxsize, **kwargs)
 
         self._proxy_url = proxy_url
+        self._parsed_proxy_url = (
+            parse_url(proxy_url)
+            if isinstance(proxy_url, six.string_types)
+            else proxy_url
+        )
 
     def get_additional_curl_options(self):
         options = [
-            (pycurl.PROXY, self._proxy_url.host),
+            (pycurl.PROXY, self._parsed_proxy_url.host),
             (pycurl.PROXYAUTH, pycurl.HTTPAUTH_ANY),
-            (pycurl.PROXYUSERPWD, self._proxy_url.auth),
+            (pycurl.PROXYUSERPWD, self._parsed_proxy_url.auth),
         ]
 
-        if self._proxy_url.port:
-            options.append((pycurl.PROXYPORT, self._proxy_url.port))
+        if self._parsed_proxy_url.port:
+            options.append((pycurl.PROXYPORT, self._parsed_proxy_url.port))
 
         return options
 
@@ -142,6 +521,14 @@ class ProxyCURLHandlerPool(CURLHandlerPool):
         return self._proxy_url
 
 
+def _is_handler_broken(error):
+    if isinstance(error, pycurl.error):
+        return error.args[0] in _BROKEN_HANDLER_ERRORS
+
+    # Any other error may have interrupted the handler at any point
+    return True
+
+
 def _get_curl_options_for_response(response):
     return {
         pycurl.HEADERFUNCTION: response.add_header_from_raw_line,
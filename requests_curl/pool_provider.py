@@ -1,76 +1,281 @@
+import os
+import pycurl
+import re
+import threading
+
+from collections import OrderedDict
+from functools import partial
 from itertools import chain
-from urllib3.poolmanager import PoolManager
+from urllib3.exceptions import LocationValueError, URLSchemeUnknown
 from urllib3.util import parse_url
 from requests.utils import prepend_scheme_if_needed
 from requests.exceptions import InvalidProxyURL
 
-from .pool import CURLHandlerPool, ProxyCURLHandlerPool
+from .pool import CURLHandlerPool, ProxyCURLHandlerPool, keep_inherited
+from .tls import CURLTLSConfig
+
+# Default port of each scheme a pool can be created for
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Matches the scheme and authority of an URL, the only parts that select its pool
+_ORIGIN_PATTERN = re.compile(r"[^:/?#]*://[^/?#]*")
+
+# Number of parsed origins, and proxy URLs, kept to avoid parsing them again
+_MAX_PARSED_URLS = 1024
+
+
+class CURLPoolIndex(object):
+    """Thread-safe index of pools by key, that only keeps the `max_size` most recently
+    used ones. The least recently used one is closed to make room for a new one, and
+    every pool is closed when the index is cleared.
+
+    Any object with a `close` method can be indexed, including other indexes.
+    """
+
+    def __init__(self, max_size, pool_factory):
+        """Initializes an empty index.
+
+        Args:
+            max_size (int): the maximum number of pools kept, at least 1.
+            pool_factory (callable): builds the pool of a key, given the key.
+        """
+        self._max_size = max(max_size, 1)
+        self._pool_factory = pool_factory
+        # Pools by key, from the least to the most recently used
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the pool of the given key, created if it was not indexed yet."""
+        evicted_pools = []
+
+        with self._lock:
+            # Taken out and added back, so it becomes the most recently used
+            pool = self._pools.pop(key, None)
+
+            if pool is None:
+                pool = self._pool_factory(key)
+
+                while len(self._pools) >= self._max_size:
+                    _, evicted_pool = self._pools.popitem(last=False)
+                    evicted_pools.append(evicted_pool)
+
+            self._pools[key] = pool
+
+        # Handlers in use are closed once given back to their closed pool
+        for evicted_pool in evicted_pools:
+            evicted_pool.close()
+
+        return pool
+
+    def values(self):
+        """Returns a snapshot of the indexed pools."""
+        with self._lock:
+            return list(self._pools.values())
+
+    def clear(self):
+        """Removes every pool from the index, and closes them."""
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+
+        for pool in pools:
+            pool.close()
+
+    close = clear
+
+    def __len__(self):
+        return len(self._pools)
 
 
 class CURLPoolProvider(object):
     """This class provides a pool for a given URL. The pool then will handle all
-    connections for that specific URL."""
+    connections for that specific URL.
 
-    def __init__(self, max_pools, max_pool_size, pool_block):
+    All the CURL handlers created by the provider are attached to the same `pycurl.CurlShare`,
+    so they share the DNS cache and the TLS sessions, no matter the pool they belong to. PyCURL
+    provides the lock callbacks required to use the share from many threads. The connections
+    cache is not shared, since libcurl does not support using a shared one from many threads
+    at once: each handler keeps its own connections alive instead.
+
+    Pools are indexed by scheme, host and port, which are parsed once for each origin,
+    and by the TLS configuration of HTTPS requests: connections, and the TLS sessions
+    they resume, are not reused by requests with different `verify` or `cert` settings.
+    Pools for proxied URLs are grouped by proxy. Only the groups of the `max_proxies`
+    most recently used proxies are kept: the pools of the least recently used one are
+    closed to make room for a new proxy.
+
+    The provider is fork-safe: a child process leaves the share and the pools it inherits
+    to the parent process, and creates its own ones, when first used."""
+
+    def __init__(
+        self, max_pools, max_pool_size, pool_block, pool_warm_size=0, max_proxies=10
+    ):
         self._max_pools = max_pools
         self._max_pool_size = max_pool_size
         self._pool_block = pool_block
+        self._pool_warm_size = pool_warm_size
+        self._max_proxies = max_proxies
+        self._create_pools()
+
+        # Pool keys by origin, and parsed proxy URLs by proxy URL
+        self._pool_keys = {}
+        self._parsed_proxy_urls = {}
+
+    def _create_pools(self):
+        # Process that created the share and the pools
+        self._pid = os.getpid()
+        self._curl_share = _create_curl_share()
+
+        self._pools = CURLPoolIndex(self._max_pools, self._create_pool)
+        # Indexes of the pools of each proxy, by parsed proxy URL
+        self._proxied_pools = CURLPoolIndex(
+            self._max_proxies, self._create_proxy_pool_index
+        )
 
-        self._pool_manager = self._create_pool_manager(
-            lambda url, port, **kwargs: CURLHandlerPool(**kwargs)
+    def _check_fork(self):
+        """Drops the share and the pools inherited from the parent process, if the
+        provider is used from a child process for the first time."""
+        if self._pid != os.getpid():
+            keep_inherited(self._curl_share, self._pools, self._proxied_pools)
+            self._create_pools()
+
+    def _create_pool(self, pool_key):
+        return CURLHandlerPool(
+            curl_factory=self._create_curl_handler,
+            maxsize=self._max_pool_size,
+            block=self._pool_block,
+            warm_size=self._pool_warm_size,
+            host_key=_build_host_key(*pool_key),
         )
 
-        self._pool_manager_per_proxy = {}
+    def _create_proxy_pool_index(self, parsed_proxy_url):
+        return CURLPoolIndex(
+            self._max_pools, partial(self._create_proxy_pool, parsed_proxy_url)
+        )
 
-    def _create_pool_manager(self, pool_factory):
-        pool_manager = PoolManager(
-            num_pools=self._max_pools,
+    def _create_proxy_pool(self, parsed_proxy_url, pool_key):
+        return ProxyCURLHandlerPool(
+            parsed_proxy_url.url,
+            curl_factory=self._create_curl_handler,
             maxsize=self._max_pool_size,
             block=self._pool_block,
-            strict=True,
+            warm_size=self._pool_warm_size,
+            host_key=_build_host_key(*pool_key, proxy_url=parsed_proxy_url),
         )
 
-        pool_manager.pool_classes_by_scheme = {
-            "http": pool_factory,
-            "https": pool_factory,
-        }
+    def _create_curl_handler(self):
+        curl_handler = pycurl.Curl()
+        curl_handler.setopt(pycurl.SHARE, self._curl_share)
+        return curl_handler
 
-        return pool_manager
+    @property
+    def curl_share(self):
+        self._check_fork()
+        return self._curl_share
 
-    def get_pool_for_url(self, url):
-        """Returns an instance of a CURLHandlerPool for a given URL"""
-        return self._pool_manager.connection_from_url(url)
+    def get_pool_for_url(self, url, tls_config=None):
+        """Returns an instance of a CURLHandlerPool for a given URL, and the TLS
+        configuration of the request, the default one if not given."""
+        self._check_fork()
+        return self._pools.get(self._get_pool_key(url, tls_config))
 
-    def get_pool_for_proxied_url(self, proxy_url, url):
+    def get_pool_for_proxied_url(self, proxy_url, url, tls_config=None):
         """Returns an instance of a CURLHandlerPool for a given URL, but using a Proxy"""
-        parsed_proxy_url = _parse_proxy_url(proxy_url)
+        self._check_fork()
+        parsed_proxy_url = _get_parsed(
+            self._parsed_proxy_urls, proxy_url, _parse_proxy_url
+        )
+        proxy_pools = self._proxied_pools.get(parsed_proxy_url)
 
-        if parsed_proxy_url not in self._pool_manager_per_proxy:
-            # Create here the poolmanager for proxy
-            self._pool_manager_per_proxy[parsed_proxy_url] = self._create_pool_manager(
-                lambda url, port, maxsize=1, **kwargs: ProxyCURLHandlerPool(
-                    proxy_url, maxsize=maxsize, **kwargs
-                )
-            )
+        return proxy_pools.get(self._get_pool_key(url, tls_config))
 
-        pool_manager = self._pool_manager_per_proxy[parsed_proxy_url]
+    def _get_pool_key(self, url, tls_config):
+        origin_match = _ORIGIN_PATTERN.match(url)
+        origin = origin_match.group() if origin_match else url
+        scheme, host, port = _get_parsed(self._pool_keys, origin, _parse_pool_key)
 
-        return pool_manager.connection_from_url(url)
+        # Plain HTTP connections don't depend on the TLS configuration
+        if scheme != "https":
+            tls_config = None
+        elif tls_config is None:
+            tls_config = CURLTLSConfig.get()
 
-    @property
-    def _pool_managers(self):
-        return chain((self._pool_manager,), self._pool_manager_per_proxy.values())
+        return scheme, host, port, tls_config
+
+    def _all_pools(self):
+        proxy_pools = self._proxied_pools.values()
+        return chain(self._pools.values(), *(pools.values() for pools in proxy_pools))
+
+    def stats(self):
+        """Returns a snapshot of the usage statistics of every pool in use.
+
+        Returns:
+            dict: the statistics of each pool (see `CURLPoolStats.snapshot`), by host key.
+        """
+        self._check_fork()
+        return {pool.host_key: pool.stats() for pool in self._all_pools() if pool.open}
 
     def clear(self):
-        for pool_manager in self._pool_managers:
-            pool_manager.clear()
+        self._check_fork()
+        self._pools.clear()
+        self._proxied_pools.clear()
 
     def __len__(self):
         """Returns the number of pools that this provider currently handles"""
-        proxy_pools_count = sum(
-            len(pool_manager.pools) for pool_manager in self._pool_managers
-        )
-        return proxy_pools_count
+        proxy_pools_count = sum(len(pools) for pools in self._proxied_pools.values())
+        return len(self._pools) + proxy_pools_count
+
+
+def _build_host_key(scheme, host, port, tls_config=None, proxy_url=None):
+    host_key = "{0}://{1}:{2}".format(scheme, host, port)
+
+    if tls_config is not None and not tls_config.is_default:
+        host_key = "{0} ({1})".format(host_key, tls_config)
+
+    if proxy_url is not None:
+        host_key = "{0} via {1}".format(host_key, proxy_url)
+
+    return host_key
+
+
+def _create_curl_share():
+    curl_share = pycurl.CurlShare()
+
+    for shared_data in (
+        pycurl.LOCK_DATA_DNS,
+        pycurl.LOCK_DATA_SSL_SESSION,
+    ):
+        curl_share.setopt(pycurl.SH_SHARE, shared_data)
+
+    return curl_share
+
+
+def _get_parsed(parsed_urls, url, parse_func):
+    parsed_url = parsed_urls.get(url)
+
+    if parsed_url is None:
+        parsed_url = parse_func(url)
+
+        # Dropping every entry is enough to bound the cache, as URLs are rarely unique
+        if len(parsed_urls) >= _MAX_PARSED_URLS:
+            parsed_urls.clear()
+        parsed_urls[url] = parsed_url
+
+    return parsed_url
+
+
+def _parse_pool_key(origin):
+    parsed_url = parse_url(origin)
+    scheme = (parsed_url.scheme or "http").lower()
+
+    if scheme not in _DEFAULT_PORTS:
+        raise URLSchemeUnknown(scheme)
+
+    if not parsed_url.host:
+        raise LocationValueError("No host specified.")
+
+    return scheme, parsed_url.host.lower(), parsed_url.port or _DEFAULT_PORTS[scheme]
 
 
 def _parse_proxy_url(proxy_url):
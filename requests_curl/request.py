@@ -1,32 +1,79 @@
-import os
 import six
+import time
 import pycurl
 
-from requests.adapters import DEFAULT_CA_BUNDLE_PATH
+from urllib3.util import Timeout
+
+from .tls import CURLTLSConfig
+
+_HTTP2_VERSIONS = (
+    pycurl.CURL_HTTP_VERSION_2_0,
+    pycurl.CURL_HTTP_VERSION_2TLS,
+    pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE,
+)
+
+# libcurl tells when the connection is established through PREREQFUNCTION since 7.80
+_HAS_PREREQ_FUNCTION = hasattr(pycurl, "PREREQFUNCTION")
+
+# libcurl times the progress reports of idle transfers from just before the last
+# progress is seen, so they come a few milliseconds short of whole seconds of idleness
+_READ_TIMEOUT_SLACK = 0.01
 
 
 class CURLRequest(object):
     """Representation of a request to be made using CURL."""
 
-    def __init__(self, request, timeout=None, verify=None, cert=None):
+    def __init__(
+        self,
+        request,
+        timeout=None,
+        verify=None,
+        cert=None,
+        http_version=None,
+        native_decoding=False,
+        receive_buffer_size=None,
+        spool_size=None,
+        max_body_size=None,
+    ):
         """Initializes a CURL request from a given prepared request
 
         Args:
             request (PreparedRequest): the prepared request comming from `requests` library.
             timeout (float, optional): Defaults to None. How many seconds to
                 wait for the server to send data before giving up, as a float,
-                or a `(connect timeout, read timeout)` tuple.
+                or a `(connect timeout, read timeout)` tuple, or an
+                `urllib3.util.Timeout` which can also limit the whole transfer.
             verify (bool, optional): Defaults to True. Either a boolean, in
                 which case it controls whether we verify the server's TLS
                 certificate, or a string, in which case it must be a path
                 to a CA bundle to use.
             cert (str, optional): Defaults to None. Any user-provided SSL
                 certificate to be trusted.
+            http_version (int, optional): Defaults to None. The HTTP version to use, as
+                one of the pycurl.CURL_HTTP_VERSION_* values. If not given, it is up to
+                libcurl.
+            native_decoding (bool, optional): Defaults to False. Whether libcurl decodes
+                compressed response bodies while receiving them. libcurl then advertises
+                the encodings it supports, instead of the Accept-Encoding header of the
+                request.
+            receive_buffer_size (int, optional): Defaults to None. Size in bytes of the
+                buffer libcurl receives the response body in, which is the largest chunk
+                written at once. If not given, it is up to libcurl.
+            spool_size (int, optional): Defaults to None. Size in bytes above which a
+                response body kept in memory is moved to a temporary file. If not
+                given, bodies are always kept in memory.
+            max_body_size (int, optional): Defaults to None. Size in bytes above which
+                the transfer is aborted, as soon as the Content-Length header or the
+                body received exceeds it. If not given, bodies can be of any size.
         """
         self._request = request
         self._timeout = timeout
-        self._cert = cert
-        self._verify = verify
+        self._tls_config = CURLTLSConfig.get(verify, cert)
+        self._http_version = http_version
+        self._native_decoding = native_decoding
+        self._receive_buffer_size = receive_buffer_size
+        self._spool_size = spool_size
+        self._max_body_size = max_body_size
         self._curl_options = None
         self._body_stream = None
 
@@ -38,6 +85,69 @@ class CURLRequest(object):
     def request(self):
         return self._request
 
+    @property
+    def tls_config(self):
+        """CURLTLSConfig: the TLS settings of the request"""
+        return self._tls_config
+
+    @property
+    def native_decoding(self):
+        """Whether the response body is already decoded when received"""
+        return self._native_decoding
+
+    @property
+    def spool_size(self):
+        """Size above which a response body kept in memory is moved to a temporary file"""
+        return self._spool_size
+
+    @property
+    def read_timeout(self):
+        """Seconds the server can go without sending data, None if not limited. It is
+        enforced by the `CURLReadTimer` of each transfer, and not by an option."""
+        return split_timeout(self._timeout)[1]
+
+    def set_timeout(self, timeout):
+        """Changes the timeout of the request, keeping the rest of its options if they
+        were already built.
+
+        Args:
+            timeout (float or tuple or urllib3.util.Timeout): the new timeout.
+        """
+        if self._curl_options is not None:
+            for option in self.build_timeout_options():
+                del self._curl_options[option]
+
+        self._timeout = timeout
+
+        if self._curl_options is not None:
+            self._curl_options.update(self.build_timeout_options())
+
+    def rewind(self):
+        """Rewinds the body of the request, so it can be sent again.
+
+        Returns:
+            bool: whether the request can be sent again. It can't if its body is a stream
+                whose initial position is unknown, or that can't be rewound.
+        """
+        if self._body_stream is None:
+            return True  # No body, or one given as a string
+
+        if self._body_stream is not self._request.body:
+            self._body_stream.seek(0)
+            return True
+
+        # Position of the body when the request was prepared, set by requests
+        body_position = getattr(self._request, "_body_position", None)
+        if not isinstance(body_position, six.integer_types):
+            return False
+
+        try:
+            self._body_stream.seek(body_position)
+        except (AttributeError, IOError, OSError):
+            return False
+
+        return True
+
     @property
     def options(self):
         if self._curl_options is None:
@@ -59,6 +169,10 @@ class CURLRequest(object):
         options.update(self.build_timeout_options())
         options.update(self.build_ca_options())
         options.update(self.build_cert_options())
+        options.update(self.build_http_version_options())
+        options.update(self.build_encoding_options())
+        options.update(self.build_receive_buffer_options())
+        options.update(self.build_max_body_size_options())
 
         return options
 
@@ -66,6 +180,10 @@ class CURLRequest(object):
         """Returns a dict with the pycurl option for the headers."""
         req_headers = self._request.headers.copy()
 
+        if self._native_decoding:
+            # libcurl sets the header with the encodings it is able to decode
+            req_headers.pop("Accept-Encoding", None)
+
         headers = [
             "{name}: {value}".format(name=name, value=value)
             for name, value in six.iteritems(req_headers)
@@ -110,55 +228,172 @@ class CURLRequest(object):
             return {}
 
     def build_timeout_options(self):
-        """Returns the curl timeout options."""
-        if isinstance(self._timeout, (tuple, list)):
-            conn_timeout, read_timeout = self._timeout
-            total_timeout = conn_timeout + read_timeout
-            return {
-                pycurl.TIMEOUT_MS: int(1000 * total_timeout),
-                pycurl.CONNECTTIMEOUT_MS: int(1000 * conn_timeout),
-            }
-        elif self._timeout:
-            return {pycurl.TIMEOUT_MS: int(1000 * self._timeout)}
-        else:
-            return {}
+        """Returns the curl timeout options.
+
+        The read timeout has no option: libcurl only has low speed limits, which average
+        the speed over several seconds, so a stall after some data was received would go
+        unnoticed for that long. It is enforced by a `CURLReadTimer` instead. The total
+        timeout of an `urllib3.util.Timeout` limits the whole transfer.
+        """
+        connect_timeout, _, total_timeout = split_timeout(self._timeout)
+        options = {}
+
+        if connect_timeout:
+            options[pycurl.CONNECTTIMEOUT_MS] = _to_milliseconds(connect_timeout)
+
+        if total_timeout:
+            options[pycurl.TIMEOUT_MS] = _to_milliseconds(total_timeout)
+
+        return options
 
     def build_ca_options(self):
         """Configures the CA of this curl request."""
-        if self._verify:
-            ca_value = (
-                self._verify
-                if isinstance(self._verify, six.string_types)
-                else DEFAULT_CA_BUNDLE_PATH
-            )
-
-            # Requests allows the verify parameter to be a file or a directory. This requires
-            # a different CURL option for each case
-            ca_opt = pycurl.CAPATH if os.path.isdir(ca_value) else pycurl.CAINFO
-
-            return {
-                pycurl.SSL_VERIFYHOST: 2,
-                pycurl.SSL_VERIFYPEER: 2,
-                ca_opt: ca_value,
-            }
+        return self._tls_config.ca_options
+
+    def build_http_version_options(self):
+        """Configures the HTTP version of this curl request."""
+        if self._http_version is None:
+            return {}
+
+        options = {pycurl.HTTP_VERSION: self._http_version}
+
+        if self._http_version in _HTTP2_VERSIONS:
+            # Waits for a connection that can be multiplexed, instead of opening a new one
+            options[pycurl.PIPEWAIT] = 1
+
+        return options
+
+    def build_encoding_options(self):
+        """Configures whether libcurl decodes the response body."""
+        if self._native_decoding:
+            # An empty string enables all the encodings supported by libcurl
+            return {pycurl.ACCEPT_ENCODING: ""}
         else:
-            return {
-                pycurl.SSL_VERIFYHOST: 0,
-                pycurl.SSL_VERIFYPEER: 0,
-            }
+            return {}
 
-    def build_cert_options(self):
-        """Configures the SSL certificate of this curl request."""
+    def build_receive_buffer_options(self):
+        """Configures the size of the buffer the response body is received in."""
+        if self._receive_buffer_size:
+            return {pycurl.BUFFERSIZE: self._receive_buffer_size}
+        else:
+            return {}
 
-        if self._cert:
-            if isinstance(self._cert, six.string_types):
-                cert_path = self._cert
-                return {pycurl.SSLCERT: cert_path}
-            else:
-                cert_path, key_path = self._cert
-                return {
-                    pycurl.SSLCERT: cert_path,
-                    pycurl.SSLKEY: key_path,
-                }
+    def build_max_body_size_options(self):
+        """Configures the largest response body to receive."""
+        if self._max_body_size is not None:
+            return {pycurl.MAXFILESIZE_LARGE: self._max_body_size}
         else:
             return {}
+
+    def build_cert_options(self):
+        """Configures the SSL certificate of this curl request."""
+        return self._tls_config.cert_options
+
+
+class CURLReadTimer(object):
+    """Read timeout of a single transfer. Just like in requests, the transfer is aborted
+    once the server went without sending data for longer than the read timeout, and not
+    once the whole transfer took that long. Connecting is limited by the connect timeout
+    instead, so the timer starts once the connection is established (or with the
+    transfer, with libcurl older than 7.80).
+
+    libcurl reports the progress of an idle transfer once a second, so the transfer is
+    aborted up to a second after the read timeout expired. Timeouts of whole seconds
+    expire on time. The timer can be paused while the transfer waits for its body to
+    be read, which is not the server going without sending data.
+    """
+
+    def __init__(self, read_timeout, clock=time.monotonic):
+        """Initializes the timer.
+
+        Args:
+            read_timeout (float): seconds the server can go without sending data.
+            clock (callable, optional): Defaults to time.monotonic. Returns the time.
+        """
+        self._read_timeout = read_timeout
+        self._clock = clock
+        # When data was last transferred, None until the connection is established
+        self._last_progress = None if _HAS_PREREQ_FUNCTION else clock()
+        self._transferred = (0, 0)
+        self._paused = False
+
+    def get_curl_options(self, response):
+        """Returns the options that enforce the timeout on the transfer of the given
+        CURLResponse, which replace its HEADERFUNCTION: headers are data too."""
+        options = {
+            pycurl.NOPROGRESS: False,
+            pycurl.XFERINFOFUNCTION: self.check_progress,
+            pycurl.HEADERFUNCTION: self._header_function(response),
+        }
+
+        if _HAS_PREREQ_FUNCTION:
+            options[pycurl.PREREQFUNCTION] = self.start
+
+        return options
+
+    def _header_function(self, response):
+        def add_header_from_raw_line(raw_header_line):
+            self._last_progress = self._clock()
+            response.add_header_from_raw_line(raw_header_line)
+
+        return add_header_from_raw_line
+
+    def start(self, *args):
+        """Callback for pycurl.PREREQFUNCTION, called once the connection is established."""
+        self._last_progress = self._clock()
+        return pycurl.PREREQFUNC_OK
+
+    def pause(self):
+        """Stops the timer, until resumed."""
+        self._paused = True
+
+    def resume(self):
+        """Restarts the timer, if it was started already."""
+        self._paused = False
+
+        if self._last_progress is not None:
+            self._last_progress = self._clock()
+
+    def check_progress(self, download_total, downloaded, upload_total, uploaded):
+        """Callback for pycurl.XFERINFOFUNCTION, which aborts the transfer, making it
+        fail with pycurl.E_ABORTED_BY_CALLBACK, once the read timeout expired."""
+        if self._last_progress is None or self._paused:
+            return 0
+
+        now = self._clock()
+        transferred = (downloaded, uploaded)
+
+        if transferred != self._transferred:
+            self._transferred = transferred
+            self._last_progress = now
+            return 0
+
+        idle_time = now - self._last_progress
+        return 1 if idle_time >= self._read_timeout - _READ_TIMEOUT_SLACK else 0
+
+
+def split_timeout(timeout):
+    """Splits a timeout, as given to requests, into its parts.
+
+    Args:
+        timeout (float or tuple or urllib3.util.Timeout): the timeout.
+
+    Returns:
+        tuple: the connect, read and total timeouts, in seconds, None if not given.
+    """
+    if isinstance(timeout, Timeout):
+        # Timeouts that were not given are sentinel objects, and not numbers
+        return tuple(
+            value if isinstance(value, (int, float)) else None
+            for value in (timeout._connect, timeout._read, timeout.total)
+        )
+    elif isinstance(timeout, (tuple, list)):
+        connect_timeout, read_timeout = timeout
+        return connect_timeout, read_timeout, None
+    else:
+        return timeout, timeout, None
+
+
+def _to_milliseconds(seconds):
+    # libcurl takes 0 as no timeout at all
+    return max(int(1000 * seconds), 1)
@@ -1,73 +1,273 @@
-import io
 import six
+import pycurl
 
-from http.client import parse_headers
+from collections import namedtuple
+from datetime import timedelta
 from requests import Response as RequestResponse
 from requests.utils import get_encoding_from_headers
 from requests.structures import CaseInsensitiveDict
 from requests.cookies import extract_cookies_to_jar
 from urllib3.response import HTTPResponse as URLLib3Rresponse
+from urllib3._collections import HTTPHeaderDict
+
+from .buffer import CURLReceiveBuffer
+
+# Headers that set cookies, either of which is needed to extract any cookie
+_COOKIE_HEADERS = ("Set-Cookie", "Set-Cookie2")
+
+
+class CURLTransferInfo(
+    namedtuple(
+        "CURLTransferInfo",
+        [
+            "namelookup_time",
+            "connect_time",
+            "appconnect_time",
+            "pretransfer_time",
+            "starttransfer_time",
+            "total_time",
+            "num_connects",
+            "connection_reused",
+        ],
+    )
+):
+    """Timing breakdown of a CURL transfer. Times are in seconds, measured from the start
+    of the transfer, as reported by libcurl:
+
+     * namelookup_time: until the name resolving was completed.
+     * connect_time: until the connection to the remote host (or proxy) was completed.
+     * appconnect_time: until the TLS handshake was completed, 0 if there was none.
+     * pretransfer_time: until the transfer was just about to begin.
+     * starttransfer_time: until the first byte of the response was received.
+     * total_time: of the whole transfer, or until now if it is still in progress.
+
+    `num_connects` is the number of new connections made for the transfer, so
+    `connection_reused` is True when an existing connection was used.
+    """
+
+    @classmethod
+    def from_curl_handler(cls, curl_handler):
+        num_connects = curl_handler.getinfo(pycurl.NUM_CONNECTS)
+
+        return cls(
+            namelookup_time=curl_handler.getinfo(pycurl.NAMELOOKUP_TIME),
+            connect_time=curl_handler.getinfo(pycurl.CONNECT_TIME),
+            appconnect_time=curl_handler.getinfo(pycurl.APPCONNECT_TIME),
+            pretransfer_time=curl_handler.getinfo(pycurl.PRETRANSFER_TIME),
+            starttransfer_time=curl_handler.getinfo(pycurl.STARTTRANSFER_TIME),
+            total_time=curl_handler.getinfo(pycurl.TOTAL_TIME),
+            num_connects=num_connects,
+            connection_reused=num_connects == 0,
+        )
 
 
 class _MockHTTPResponse:
     """Mocks HTTPResponse class to be used as original response when
     building the urllib3 response for later parsing cookies."""
 
-    def __init__(self, headers_fp):
-        headers_fp.seek(0)
-        self.msg = parse_headers(headers_fp)
+    def __init__(self, headers):
+        # Cookies are extracted with the get_all method of the headers
+        self.msg = headers
 
     def isclosed(self):
         return True
 
+    def close(self):
+        pass
+
+
+class CURLRawResponse(object):
+    """Raw response of a request whose body was completely received, and that needs no
+    decoding. It replaces the urllib3 response, so the body is not copied again into
+    urllib3 buffers. `stream` yields bytes, as `requests.Response.iter_content` and
+    `iter_lines` expect, while `stream_views` yields `memoryview` slices of the body,
+    without copying it, for callers that can handle them.
+    """
+
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, body, headers, status, reason=None, original_response=None):
+        self.headers = (
+            headers if isinstance(headers, HTTPHeaderDict) else HTTPHeaderDict(headers)
+        )
+        self.status = status
+        self.reason = reason
+        self._original_response = original_response
+        self._body = memoryview(body)
+        self._position = 0
+        self._closed = False
+
+    def read(self, amt=None, decode_content=None):
+        """Reads up to `amt` bytes of the body, or the whole remaining body if not given."""
+        return self._read_view(amt).tobytes()
+
+    def stream(self, amt=2**16, decode_content=None):
+        """Yields the remaining body, in chunks of up to `amt` bytes."""
+        for view in self.stream_views(amt):
+            yield view.tobytes()
+
+    def stream_views(self, amt=2**16):
+        """Yields the remaining body, in `memoryview` slices of up to `amt` bytes, which
+        are not copies of the body."""
+        while self._position < len(self._body):
+            yield self._read_view(amt)
+
+    def _read_view(self, amt):
+        end = len(self._body) if amt is None else self._position + amt
+        view = self._body[self._position : end]
+        self._position += len(view)
+        return view
+
+    def tell(self):
+        return self._position
+
+    def get_redirect_location(self):
+        if self.status in self.REDIRECT_STATUSES:
+            return self.headers.get("location")
+
+        return False
+
+    def release_conn(self):
+        pass
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
 
 class CURLResponse(object):
     """This class represents a CURL response"""
 
-    def __init__(self, curl_request, initial_http_code=200):
+    def __init__(self, curl_request, initial_http_code=200, body=None):
         """Initializes a new response object.
 
         Args:
             curl_request (CURLRequest): the request that originated this response.
+            body (file-like, optional): Defaults to None. Where to write the body of the
+                response. If not given, the body is kept in memory.
         """
 
         self.curl_request = curl_request
         self.request = curl_request.request
-        self.headers = dict()
-        self.body = six.BytesIO()
+        # Header lines of the last response received, parsed when first needed
+        self._raw_headers = []
+        self._headers = None
+        self.body = (
+            body
+            if body is not None
+            else CURLReceiveBuffer(spool_size=curl_request.spool_size)
+        )
+        # Whether the body is kept in memory, and not in the given file-like object
+        self._buffered = body is None
         self.reason = None
         self.http_code = initial_http_code
-        self._headers_buff = io.BytesIO(b"")
+        self.headers_complete = False
+        self.transfer_info = None
+
+    @property
+    def headers(self):
+        """urllib3.HTTPHeaderDict: the headers of the response, which keeps all the values
+        of headers received many times, such as Set-Cookie."""
+        if self._headers is None:
+            self._headers = _parse_raw_headers(self._raw_headers)
+
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers):
+        self._headers = HTTPHeaderDict(headers)
 
-    def to_requests_response(self):
+    def to_requests_response(self, raw=None):
         """Returns an instance of `requests.Response` based on this response.
 
+        Args:
+            raw (object, optional): Defaults to None. The object to expose as the raw
+                response, instead of an urllib3 response that reads the body.
+
         Returns:
             request.Response: the generated response.
         """
 
-        # Make sure that body is at position 0 before returning
-        self.body.seek(0)
+        body = self.body
+
+        if raw is None and self._buffered:
+            if not self.body.spooled and not self._needs_decoding():
+                return self._buffered_to_requests_response(self.body.getvalue())
+
+            # The body is read from a file, and decoded if needed, by urllib3
+            body = self.body.to_file()
 
+        # Make sure that body is at position 0 before returning. Streamed bodies are
+        # read as they are received, so they can't be rewinded.
+        if raw is None and body.seekable():
+            body.seek(0)
+
+        urllib3_headers = self.headers
+        if self.curl_request.native_decoding:
+            # The body was decoded by libcurl, so urllib3 must not decode it again,
+            # nor check its length against the one of the encoded body
+            urllib3_headers = HTTPHeaderDict()
+            for name, value in self.headers.iteritems():
+                if name.lower() not in ("content-encoding", "content-length"):
+                    urllib3_headers.add(name, value)
+
+        # urllib3 closes the body it reads once its response is collected
         urllib3_response = URLLib3Rresponse(
-            body=self.body,
-            headers=self.headers,
+            body=body if raw is None else None,
+            headers=urllib3_headers,
             status=self.http_code,
             request_method=self.request.method,
             reason=self.reason,
             preload_content=False,
-            original_response=_MockHTTPResponse(self._headers_buff),
+            original_response=_MockHTTPResponse(self.headers),
+        )
+
+        return self._build_requests_response(
+            urllib3_response if raw is None else raw, urllib3_response
+        )
+
+    def _needs_decoding(self):
+        if self.curl_request.native_decoding:
+            return False
+
+        content_encoding = self.headers.get("Content-Encoding")
+        return content_encoding not in (None, "", "identity")
+
+    def _buffered_to_requests_response(self, content):
+        raw = CURLRawResponse(
+            content,
+            self.headers,
+            self.http_code,
+            reason=self.reason,
+            original_response=_MockHTTPResponse(self.headers),
         )
 
+        response = self._build_requests_response(raw, raw)
+        # The content is already available. Until it is accessed, iter_content still
+        # streams the raw response
+        response._content = content
+
+        return response
+
+    def _build_requests_response(self, raw, cookies_response):
         response = RequestResponse()
         response.request = self.request
-        response.raw = urllib3_response
+        response.raw = raw
         response.status_code = self.http_code
         response.reason = self.reason
-        response.headers = CaseInsensitiveDict(response.raw.headers)
+        response.headers = CaseInsensitiveDict(self.headers)
         response.encoding = get_encoding_from_headers(response.headers)
 
-        extract_cookies_to_jar(response.cookies, self.request, urllib3_response)
+        # Just like requests does, elapsed measures until the response arrived
+        response.transfer_info = self.transfer_info
+        if self.transfer_info is not None:
+            response.elapsed = timedelta(seconds=self.transfer_info.starttransfer_time)
+
+        if any(name in self.headers for name in _COOKIE_HEADERS):
+            extract_cookies_to_jar(response.cookies, self.request, cookies_response)
 
         if isinstance(self.request.url, six.binary_type):
             response.url = self.request.url.decode("utf-8")
@@ -78,7 +278,8 @@ class CURLResponse(object):
 
     def add_header_from_raw_line(self, raw_header_line):
         """This method is to be used as a callback to configure pycurl.HEADERFUNCTION
-        option, which parses each line of the response headers.
+        option, which collects each line of the response headers. Lines are only parsed
+        once the headers are needed.
 
         The line must an array of bytes, encoded in iso-8859-1, representing the line.
 
@@ -86,20 +287,31 @@ class CURLResponse(object):
             raw_header_line: a line of the headers section, as bytes.
         """
 
-        # HTTP standard specifies that headers are encoded in iso-8859-1.
-        header_line = raw_header_line.decode("iso-8859-1")
+        # A new status line starts a new block of headers, which ends with an empty line.
+        # Only the headers of the last response are kept, and not the ones of
+        # informational responses (such as 100 Continue) that preceded it.
+        if raw_header_line.startswith(b"HTTP/"):
+            self.headers_complete = False
+            del self._raw_headers[:]
+        elif not raw_header_line.strip():
+            self.headers_complete = True
+        else:
+            self._raw_headers.append(raw_header_line)
 
-        # Header lines include the first status line (HTTP/1.x ...).
-        # We are going to ignore all lines that don't have a colon in them.
-        # This will botch headers that are split on multiple lines...
-        if ":" not in header_line:
-            return
+            if (
+                raw_header_line[:15].lower() == b"content-length:"
+                and self._expects_body
+            ):
+                content_length = raw_header_line[15:].strip()
+                if content_length.isdigit():
+                    self.body.reserve(int(content_length))
 
-        # Save the header line for later parsing cookies
-        self._headers_buff.write(raw_header_line)
+        self._headers = None
 
-        name, value = header_line.split(":", 1)
-        self.headers[name.strip()] = value.strip()
+    @property
+    def _expects_body(self):
+        # Responses to HEAD requests announce the length of a body they don't have
+        return self._buffered and self.request.method != "HEAD"
 
     def add_headers_from_raw_lines(self, raw_header_lines):
         """This method parses and adds all headers defined by the iterable of raw header lines.
@@ -111,3 +323,21 @@ class CURLResponse(object):
         """
         for raw_header_line in raw_header_lines:
             self.add_header_from_raw_line(raw_header_line)
+
+
+def _parse_raw_headers(raw_header_lines):
+    headers = HTTPHeaderDict()
+
+    for raw_header_line in raw_header_lines:
+        # HTTP standard specifies that headers are encoded in iso-8859-1.
+        header_line = raw_header_line.decode("iso-8859-1")
+
+        # We are going to ignore all lines that don't have a colon in them.
+        # This will botch headers that are split on multiple lines...
+        if ":" not in header_line:
+            continue
+
+        name, value = header_line.split(":", 1)
+        headers.add(name.strip(), value.strip())
+
+    return headers
@@ -0,0 +1,143 @@
+"""Incremental delivery of response bodies, for streamed requests"""
+
+from collections import deque
+
+from .error import to_requests_exception
+from .multi import CURLMulti
+
+
+class CURLStreamingBody(object):
+    """File-like response body that is received as it is read.
+
+    The transfer is driven by its own `pycurl.CurlMulti`, and only while there is no
+    pending data to be read. This keeps memory bounded to the few chunks that libcurl
+    delivers on each step, no matter the size of the body.
+    """
+
+    def __init__(self, multi_factory=CURLMulti):
+        self._multi_factory = multi_factory
+        self._multi = None
+        self._transfer = None
+        self._chunks = deque()
+        self._done = False
+        self._curl_error = None
+        self._closed = False
+
+    def write(self, chunk):
+        """Callback for pycurl.WRITEFUNCTION, that keeps the received chunk until it is read."""
+        self._chunks.append(chunk)
+
+    def start(self, transfer):
+        """Starts the given transfer, and drives it until the response headers were received.
+
+        Args:
+            transfer (CURLTransfer): a configured transfer, whose response body is this object.
+
+        Raises:
+            pycurl.error: if the transfer failed before receiving the response headers.
+        """
+        self._transfer = transfer
+        self._multi = self._multi_factory()
+        self._multi.add_transfer(transfer)
+
+        try:
+            self._perform_until(lambda: transfer.headers_received)
+
+        except Exception:
+            self.close()
+            raise
+
+        if self._curl_error is not None:
+            self.close()
+            raise self._curl_error
+
+        # Streamed responses are returned early, so timings are the ones until the headers
+        transfer.update_response_info()
+
+    def _perform_until(self, condition):
+        # The time the body waited to be read is not the server going without sending data
+        self._transfer.resume_read_timer()
+
+        while not self._done:
+            self._perform()
+
+            if self._done or condition():
+                break
+
+            self._multi.wait()
+
+    def _perform(self):
+        for transfer, curl_error in self._multi.perform():
+            self._done = True
+
+            if curl_error is None:
+                transfer.finish()
+            else:
+                transfer.fail(curl_error)
+                self._curl_error = curl_error
+
+    def read(self, amt=None):
+        """Reads up to `amt` bytes of the body, or the whole remaining body if not given.
+
+        Raises:
+            requests.exceptions.RequestException: if the transfer failed while receiving the body.
+                Note that when the body is consumed through `requests.Response.iter_content`,
+                urllib3 wraps this error as a `ProtocolError`, so requests raises it as
+                `ChunkedEncodingError`, just like for a body truncated by the server.
+        """
+        if amt is None:
+            self._perform_until(lambda: False)
+        elif not self._chunks:
+            self._perform_until(lambda: self._chunks)
+
+        if not self._chunks and self._curl_error is not None:
+            raise to_requests_exception(
+                self._curl_error, self._transfer.response.request
+            )
+
+        return pop_chunks(self._chunks, amt)
+
+    def seekable(self):
+        return False
+
+    @property
+    def closed(self):
+        # Once the whole body was read, the body reports itself as closed, so
+        # urllib3 knows the stream is over
+        exhausted = self._done and not self._chunks and self._curl_error is None
+        return self._closed or exhausted
+
+    def isclosed(self):
+        return self.closed
+
+    def close(self):
+        """Closes the body, aborting the transfer if it was not completed yet."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._chunks.clear()
+
+        if self._multi is not None:
+            # Aborts the transfer if still running, giving back its handler
+            self._multi.close()
+
+
+def pop_chunks(chunks, amt=None):
+    """Takes up to `amt` bytes from the start of a deque of chunks, or all of them if
+    `amt` is not given. A chunk larger than needed is split, keeping its remainder."""
+    data = []
+    size = 0
+
+    while chunks and (amt is None or size < amt):
+        chunk = chunks.popleft()
+
+        if amt is not None and size + len(chunk) > amt:
+            missing = amt - size
+            chunks.appendleft(chunk[missing:])
+            chunk = chunk[:missing]
+
+        data.append(chunk)
+        size += len(chunk)
+
+    return b"".join(data)
@@ -0,0 +1,139 @@
+import os
+import six
+import pycurl
+import threading
+
+from requests.adapters import DEFAULT_CA_BUNDLE_PATH
+
+# Number of TLS configurations kept, to avoid resolving them again
+_MAX_TLS_CONFIGS = 256
+
+
+class CURLTLSConfig(object):
+    """The TLS settings of a request, given as the `verify` and `cert` arguments of
+    requests, and the CURL options they resolve to.
+
+    Options are resolved once for each configuration, which `get` keeps: whether the
+    CA bundle is a directory is not checked on every request. Certificates are still
+    given to libcurl as paths, and not loaded as blobs: libcurl keeps the CA store it
+    loads from a file for later connections of the same handler, and only resumes TLS
+    sessions of client certificates given as paths.
+    """
+
+    _configs = {}
+    _configs_lock = threading.Lock()
+
+    def __init__(self, verify=True, cert=None):
+        """Initializes the TLS configuration.
+
+        Args:
+            verify (bool, optional): Defaults to True. Either a boolean, in
+                which case it controls whether we verify the server's TLS
+                certificate, or a string, in which case it must be a path
+                to a CA bundle to use.
+            cert (str, optional): Defaults to None. Any user-provided SSL
+                certificate to be trusted, or a (certificate, key) tuple.
+        """
+        self._verify, self._cert = _build_key(verify, cert)
+        self._ca_options = _build_ca_options(self._verify)
+        self._cert_options = _build_cert_options(self._cert)
+
+    @classmethod
+    def get(cls, verify=True, cert=None):
+        """Returns the TLS configuration of the given settings, resolved only once.
+
+        Args:
+            verify (bool or str, optional): Defaults to True. Same as in `__init__`.
+            cert (str or tuple, optional): Defaults to None. Same as in `__init__`.
+
+        Returns:
+            CURLTLSConfig: the configuration.
+        """
+        key = _build_key(verify, cert)
+        tls_config = cls._configs.get(key)
+
+        if tls_config is None:
+            tls_config = cls(verify, cert)
+
+            with cls._configs_lock:
+                if len(cls._configs) >= _MAX_TLS_CONFIGS:
+                    cls._configs.clear()
+                cls._configs[key] = tls_config
+
+        return tls_config
+
+    @property
+    def key(self):
+        """Identifies the configuration, for configurations to be told apart."""
+        return self._verify, self._cert
+
+    @property
+    def is_default(self):
+        """Whether the server certificate is verified with the default CA bundle, and
+        no client certificate is used."""
+        return self._verify is True and not self._cert
+
+    @property
+    def ca_options(self):
+        return dict(self._ca_options)
+
+    @property
+    def cert_options(self):
+        return dict(self._cert_options)
+
+    def __eq__(self, other):
+        return isinstance(other, CURLTLSConfig) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return "verify={0}, cert={1}".format(self._verify, self._cert)
+
+
+def _build_key(verify, cert):
+    if cert and not isinstance(cert, six.string_types):
+        cert = tuple(cert)
+
+    # Disabled verification and missing certificates are given in many ways
+    return verify if verify else False, cert if cert else None
+
+
+def _build_ca_options(verify):
+    if verify:
+        ca_value = (
+            verify if isinstance(verify, six.string_types) else DEFAULT_CA_BUNDLE_PATH
+        )
+
+        # Requests allows the verify parameter to be a file or a directory. This requires
+        # a different CURL option for each case
+        ca_opt = pycurl.CAPATH if os.path.isdir(ca_value) else pycurl.CAINFO
+
+        return {
+            pycurl.SSL_VERIFYHOST: 2,
+            pycurl.SSL_VERIFYPEER: 2,
+            ca_opt: ca_value,
+        }
+    else:
+        return {
+            pycurl.SSL_VERIFYHOST: 0,
+            pycurl.SSL_VERIFYPEER: 0,
+        }
+
+
+def _build_cert_options(cert):
+    if cert:
+        if isinstance(cert, six.string_types):
+            cert_path = cert
+            return {pycurl.SSLCERT: cert_path}
+        else:
+            cert_path, key_path = cert
+            return {
+                pycurl.SSLCERT: cert_path,
+                pycurl.SSLKEY: key_path,
+            }
+    else:
+        return {}
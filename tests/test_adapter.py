@@ -1,3 +1,4 @@
+import io
 import pytest
 import pycurl
 
@@ -10,9 +11,12 @@ from requests.exceptions import (
     SSLError,
     ProxyError,
     ConnectTimeout,
+    RetryError,
 )
+from urllib3.util import Retry, Timeout
 
 from requests_curl.adapter import CURLAdapter
+from requests_curl.error import ResponseBodyTooLarge
 from requests_curl.response import CURLResponse
 
 
@@ -31,6 +35,7 @@ def test_create_adapter_with_custom_retries():
 class FakePool:
     def __init__(self):
         self._response_data = deque()
+        self.curl_requests = []
 
     def add_response(self, status, body, header_lines):
         self._response_data.append((status, body, header_lines))
@@ -38,14 +43,16 @@ class FakePool:
     def add_exception(self, exception):
         self._response_data.append(exception)
 
-    def send(self, curl_request):
+    def send(self, curl_request, body=None):
+        self.curl_requests.append(curl_request)
+        curl_request.options  # Applied to the handler, just like pools do
         response_data = self._response_data.popleft()
 
         if isinstance(response_data, Exception):
             raise response_data
         else:
-            response = CURLResponse(curl_request)
-            response.status = response_data[0]
+            response = CURLResponse(curl_request, body=body)
+            response.http_code = response_data[0]
             response.body.write(response_data[1])
             response.add_headers_from_raw_lines(response_data[2])
 
@@ -63,15 +70,18 @@ class FakePoolProvider:
     def add_pool_for_proxied_url(self, proxy_url, url, pool):
         self._pools[(proxy_url, url)] = pool
 
-    def get_pool_for_url(self, url):
+    def get_pool_for_url(self, url, tls_config=None):
         return self._pools[url]
 
-    def get_pool_for_proxied_url(self, proxy_url, url):
+    def get_pool_for_proxied_url(self, proxy_url, url, tls_config=None):
         return self._pools[(proxy_url, url)]
 
     def clear(self):
         self._cleared = True
 
+    def stats(self):
+        return {url: {"requests": 1} for url in self._pools}
+
     @property
     def cleared(self):
         return self._cleared
@@ -163,12 +173,34 @@ def test_adapter_reaches_max_retries_and_raises_exception():
         (pycurl.E_OPERATION_TIMEDOUT, "Connection timed out", ConnectTimeout),
         (pycurl.E_OPERATION_TIMEOUTED, "Some other time error", ReadTimeout),
         (pycurl.E_OPERATION_TIMEDOUT, "Some other time error", ReadTimeout),
+        (
+            pycurl.E_OPERATION_TIMEDOUT,
+            "Resolving timed out after 1000 milliseconds",
+            ConnectTimeout,
+        ),
+        (
+            pycurl.E_OPERATION_TIMEDOUT,
+            "Failed to connect to somehost port 80 after 1000 ms: Timeout was reached",
+            ConnectTimeout,
+        ),
+        (
+            pycurl.E_OPERATION_TIMEDOUT,
+            "Operation too slow. Less than 1 bytes/sec transferred the last 5 seconds",
+            ReadTimeout,
+        ),
+        (
+            pycurl.E_OPERATION_TIMEDOUT,
+            "Operation timed out after 60000 milliseconds with 10 bytes received",
+            ReadTimeout,
+        ),
+        (pycurl.E_ABORTED_BY_CALLBACK, "Callback aborted", ReadTimeout),
         (pycurl.E_COULDNT_RESOLVE_PROXY, "Resolve proxy error", ProxyError),
         (
             pycurl.E_RECV_ERROR,
             "Received HTTP code 407 from proxy after CONNECT",
             ProxyError,
         ),
+        (pycurl.E_FILESIZE_EXCEEDED, "Maximum file size", ResponseBodyTooLarge),
         (pycurl.E_GOT_NOTHING, "Some misterious error", ConnectionError),
     ),
 )
@@ -189,6 +221,29 @@ def test_adapter_translates_from_pycurl_errors(
         adapter.send(request)
 
 
+def test_adapter_does_not_retry_too_large_bodies():
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    pool = FakePool()
+    pool.add_exception(pycurl.error(pycurl.E_FILESIZE_EXCEEDED, "Maximum file size"))
+    pool.add_response(200, b"somebodydata", [b"HTTP/1.1 200 OK\n"])
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(request.url, pool)
+
+    adapter = CURLAdapter(
+        max_retries=1,
+        max_body_size=10,
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+    )
+
+    with pytest.raises(ResponseBodyTooLarge):
+        adapter.send(request)
+
+    assert len(pool.curl_requests) == 1
+    assert pool.curl_requests[0].options[pycurl.MAXFILESIZE_LARGE] == 10
+
+
 def test_adapter_clears_pool_provider_after_close():
     pool_provider = FakePoolProvider()
 
@@ -226,3 +281,248 @@ def test_adapter_performs_a_successful_request_through_proxy():
     assert response.status_code == 200
     assert response.text == "data obtained through proxy"
     assert response.headers == {"Content-Language": "en-US"}
+
+
+def test_adapter_stats_come_from_pool_provider():
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url("http://somefakeurl/", FakePool())
+
+    adapter = CURLAdapter(pool_provider_factory=lambda *args, **kwargs: pool_provider)
+
+    assert adapter.stats() == {"http://somefakeurl/": {"requests": 1}}
+
+
+def _adapter_with_pool(url, pool):
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(url, pool)
+
+    return CURLAdapter(pool_provider_factory=lambda *args, **kwargs: pool_provider)
+
+
+def test_adapter_downloads_body_to_path(tmp_path):
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    pool = FakePool()
+    pool.add_response(200, b"somebodydata", [b"HTTP/1.1 200 OK\n"])
+    adapter = _adapter_with_pool(request.url, pool)
+    destination = tmp_path / "body"
+
+    response = adapter.download(request, str(destination))
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert destination.read_bytes() == b"somebodydata"
+
+    curl_options = pool.curl_requests[0].options
+    assert curl_options[pycurl.ACCEPT_ENCODING] == ""
+    assert curl_options[pycurl.BUFFERSIZE] == CURLAdapter.DOWNLOAD_BUFFER_SIZE
+
+
+def test_adapter_downloads_body_to_file_object():
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    pool = FakePool()
+    pool.add_response(200, b"somebodydata", [b"HTTP/1.1 200 OK\n"])
+    adapter = _adapter_with_pool(request.url, pool)
+    destination = io.BytesIO(b"previousdata")
+    destination.seek(0, io.SEEK_END)
+
+    adapter.download(request, destination)
+
+    assert destination.getvalue() == b"previousdatasomebodydata"
+
+
+def test_adapter_removes_file_of_failed_download(tmp_path):
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    pool = FakePool()
+    pool.add_exception(pycurl.error(pycurl.E_COULDNT_CONNECT, "Could not connect"))
+    adapter = _adapter_with_pool(request.url, pool)
+    destination = tmp_path / "body"
+
+    with pytest.raises(ConnectionError):
+        adapter.download(request, str(destination))
+
+    assert not destination.exists()
+
+
+def test_adapter_replaces_executor_inherited_from_parent_process(mocker):
+    adapter = CURLAdapter(pool_provider_factory=FakePoolProvider)
+    inherited_executor = adapter._get_executor()
+    shutdown = mocker.spy(inherited_executor, "shutdown")
+
+    mocker.patch("requests_curl.adapter.os.getpid", return_value=-1)
+
+    executor = adapter._get_executor()
+    adapter.close()
+
+    assert executor is not inherited_executor
+    assert not shutdown.called
+
+
+def test_adapter_limits_retries_to_the_total_timeout(mocker):
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    clock = [0.0]
+    fake_time = mocker.patch("requests_curl.adapter.time")
+    fake_time.monotonic.side_effect = lambda: clock[0]
+    fake_time.sleep.side_effect = lambda seconds: clock.__setitem__(
+        0, clock[0] + seconds
+    )
+
+    attempt_durations = deque([1.5, 2.25, 1.5])
+    pool = FakePool()
+    for _ in attempt_durations:
+        pool.add_exception(ReadTimeout("Operation too slow"))
+
+    send = pool.send
+    attempt_timeouts = []
+
+    def timed_send(curl_request, body=None):
+        attempt_timeouts.append(
+            (
+                curl_request.options[pycurl.CONNECTTIMEOUT_MS],
+                curl_request.read_timeout,
+                curl_request.options[pycurl.TIMEOUT_MS],
+            )
+        )
+        clock[0] += attempt_durations.popleft()
+        return send(curl_request, body=body)
+
+    pool.send = timed_send
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(request.url, pool)
+
+    adapter = CURLAdapter(
+        max_retries=Retry(total=5, backoff_factor=0.125),
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+    )
+
+    with pytest.raises(ReadTimeout) as error:
+        adapter.send(request, timeout=Timeout(connect=2, read=3, total=5))
+
+    assert str(error.value) == (
+        "Operation too slow (5.500s of the 5s total timeout used by 3 attempts)"
+    )
+    # The backoff before the second attempt is 0, and before the third one 0.25s
+    assert fake_time.sleep.call_args_list == [mocker.call(0.25)]
+    assert attempt_timeouts == [(2000, 3, 5000), (2000, 3, 3500), (1000, 1, 1000)]
+
+
+def test_adapter_does_not_retry_when_backoff_exceeds_the_total_timeout(mocker):
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    sleep = mocker.patch("requests_curl.adapter.time.sleep")
+    pool = FakePool()
+    pool.add_exception(ConnectionError("first"))
+    pool.add_exception(ConnectionError("second"))
+    pool.add_response(200, b"somebodydata", [b"HTTP/1.1 200 OK\n"])
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(request.url, pool)
+
+    adapter = CURLAdapter(
+        max_retries=Retry(total=5, backoff_factor=60),
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+    )
+
+    with pytest.raises(ConnectionError, match="^second .* by 2 attempts"):
+        adapter.send(request, timeout=Timeout(total=10))
+
+    assert not sleep.called
+    assert len(pool.curl_requests) == 2
+
+
+def test_adapter_retries_status_after_the_retry_after_delay(mocker):
+    request = PreparedRequest()
+    request.prepare(
+        url="http://somefakeurl", method="PUT", headers={}, data=io.BytesIO(b"data")
+    )
+
+    sleep = mocker.patch("requests_curl.adapter.time.sleep")
+    pool = FakePool()
+    pool.add_response(503, b"", [b"HTTP/1.1 503 Unavailable\n", b"Retry-After: 2\n"])
+    pool.add_response(200, b"somebodydata", [b"HTTP/1.1 200 OK\n"])
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(request.url, pool)
+    sent_bodies = []
+    send = pool.send
+
+    def reading_send(curl_request, body=None):
+        sent_bodies.append(curl_request.options[pycurl.READFUNCTION](1024))
+        return send(curl_request, body=body)
+
+    pool.send = reading_send
+
+    adapter = CURLAdapter(
+        max_retries=Retry(total=2, status_forcelist=[503]),
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+    )
+
+    response = adapter.send(request)
+
+    assert response.status_code == 200
+    assert sleep.call_args_list == [mocker.call(2)]
+    # The same request is sent again, with its body rewound
+    assert pool.curl_requests[0] is pool.curl_requests[1]
+    assert sent_bodies == [b"data", b"data"]
+
+
+def test_adapter_does_not_retry_status_of_request_with_unrewindable_body():
+    class UnrewindableBody(object):
+        # Without tell, requests can't record where the body starts
+        def __init__(self):
+            self._body = io.BytesIO(b"data")
+            self.read = self._body.read
+
+    request = PreparedRequest()
+    request.prepare(
+        url="http://somefakeurl", method="PUT", headers={}, data=UnrewindableBody()
+    )
+
+    pool = FakePool()
+    pool.add_response(503, b"", [b"HTTP/1.1 503 Unavailable\n"])
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(request.url, pool)
+
+    adapter = CURLAdapter(
+        max_retries=Retry(total=2, status_forcelist=[503]),
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+    )
+
+    response = adapter.send(request)
+
+    assert response.status_code == 503
+    assert len(pool.curl_requests) == 1
+
+
+@pytest.mark.parametrize("raise_on_status", (True, False))
+def test_adapter_status_retries_exhausted(mocker, raise_on_status):
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    mocker.patch("requests_curl.adapter.time.sleep")
+    pool = FakePool()
+    for _ in range(2):
+        pool.add_response(503, b"", [b"HTTP/1.1 503 Unavailable\n"])
+    pool_provider = FakePoolProvider()
+    pool_provider.add_pool_for_url(request.url, pool)
+
+    adapter = CURLAdapter(
+        max_retries=Retry(
+            total=1, status_forcelist=[503], raise_on_status=raise_on_status
+        ),
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+    )
+
+    if raise_on_status:
+        with pytest.raises(RetryError):
+            adapter.send(request)
+    else:
+        assert adapter.send(request).status_code == 503
+
+    assert len(pool.curl_requests) == 2
@@ -0,0 +1,198 @@
+import asyncio
+import pycurl
+import pytest
+
+from requests import PreparedRequest
+from requests.exceptions import ConnectionError
+
+from requests_curl.adapter import CURLAdapter
+from requests_curl.aio import AsyncCURLClient
+from requests_curl.multi import CURLMulti
+from requests_curl.pool import CURLHandlerPool
+
+from tests.test_multi import FakePoolProvider
+from tests.test_stream import ChunkedCurlHandler, SteppingCurlMulti
+
+
+class SocketCurlMulti(SteppingCurlMulti):
+    """Fake multi driven through socket_action, that steps every transfer each time
+    its timer expires, instead of watching real sockets."""
+
+    def __init__(self):
+        super(SocketCurlMulti, self).__init__()
+        self.options = {}
+
+    def setopt(self, option, value):
+        self.options[option] = value
+
+    def add_handle(self, curl_handler):
+        super(SocketCurlMulti, self).add_handle(curl_handler)
+        self.options[pycurl.M_TIMERFUNCTION](0)
+
+    def socket_action(self, sock_fd, ev_bitmask):
+        assert sock_fd == pycurl.SOCKET_TIMEOUT
+
+        self.perform()
+
+        if len(self._done) < len(self.handlers):
+            self.options[pycurl.M_TIMERFUNCTION](0)
+
+        return pycurl.E_MULTI_OK, len(self.handlers)
+
+
+class PausableCurlHandler(ChunkedCurlHandler):
+    """Fake handler that stops delivering chunks while paused, just like libcurl."""
+
+    def __init__(self, chunks, error=None):
+        super(PausableCurlHandler, self).__init__(chunks, error)
+        self.paused = False
+        self.times_paused = 0
+
+    def step(self):
+        if self.paused:
+            return False
+
+        if self.steps == 0 or not self.chunks:
+            return super(PausableCurlHandler, self).step()
+
+        self.steps += 1
+        # A paused chunk is delivered again once the transfer is resumed
+        if self.options[pycurl.WRITEFUNCTION](self.chunks[0]) == pycurl.WRITEFUNC_PAUSE:
+            self.paused = True
+            self.times_paused += 1
+            return False
+
+        self.chunks.pop(0)
+        return not self.chunks and self.error is None
+
+    def pause(self, bitmask):
+        self.paused = bitmask != pycurl.PAUSE_CONT
+
+
+class RepeatingCurlHandler(ChunkedCurlHandler):
+    """Fake handler that delivers the same response on every transfer."""
+
+    def __init__(self, chunks):
+        super(RepeatingCurlHandler, self).__init__(chunks)
+        self.response_chunks = list(chunks)
+
+    def step(self):
+        done = super(RepeatingCurlHandler, self).step()
+
+        if done:
+            self.steps = 0
+            self.chunks = list(self.response_chunks)
+
+        return done
+
+
+def _client_for_pools(pools, **kwargs):
+    pool_provider = FakePoolProvider(pools)
+    adapter = CURLAdapter(pool_provider_factory=lambda *args, **kwargs: pool_provider)
+    return AsyncCURLClient(
+        adapter,
+        multi_factory=lambda: CURLMulti(multi_factory=SocketCurlMulti),
+        **kwargs
+    )
+
+
+def _prepare_request(url="http://somefakeurl"):
+    request = PreparedRequest()
+    request.prepare(url=url, method="GET", headers={})
+    return request
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_client_sends_request():
+    curl_handler = ChunkedCurlHandler([b"some", b"body"])
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    client = _client_for_pools({"http://somefakeurl/": pool})
+
+    response = _run(client.send(_prepare_request()))
+
+    assert response.status_code == 200
+    assert response.text == "somebody"
+    assert pool.get_handler_from_pool() is curl_handler
+
+
+def test_client_raises_when_request_fails():
+    error = pycurl.error(pycurl.E_COULDNT_CONNECT, "Could not connect")
+    curl_handler = ChunkedCurlHandler([], error=error)
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    client = _client_for_pools({"http://somefakeurl/": pool})
+
+    with pytest.raises(ConnectionError):
+        _run(client.send(_prepare_request()))
+
+
+def test_client_waits_for_handlers_when_pool_is_empty():
+    pool = CURLHandlerPool(curl_factory=lambda: RepeatingCurlHandler([b"somebody"]))
+    client = _client_for_pools({"http://somefakeurl/": pool})
+
+    async def send_all():
+        return await asyncio.gather(
+            *[client.send(_prepare_request()) for _ in range(3)]
+        )
+
+    responses = _run(send_all())
+
+    assert [response.text for response in responses] == ["somebody"] * 3
+
+
+def test_client_streams_response_content():
+    curl_handler = ChunkedCurlHandler([b"first", b"second", b"third"])
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    client = _client_for_pools({"http://somefakeurl/": pool})
+
+    async def send_and_read():
+        response = await client.send(_prepare_request(), stream=True)
+        steps_before_reading = curl_handler.steps
+        chunks = [chunk async for chunk in response.raw]
+        return response, steps_before_reading, chunks
+
+    response, steps_before_reading, chunks = _run(send_and_read())
+
+    assert response.status_code == 200
+    assert steps_before_reading == 1
+    assert b"".join(chunks) == b"firstsecondthird"
+    assert response.raw.closed
+    assert pool.get_handler_from_pool() is curl_handler
+
+
+def test_client_pauses_streamed_transfer_until_body_is_read():
+    curl_handler = PausableCurlHandler([b"first", b"second", b"third"])
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    client = _client_for_pools({"http://somefakeurl/": pool}, stream_buffer_size=4)
+
+    async def send_and_read():
+        response = await client.send(_prepare_request(), stream=True)
+        # Lets the transfer run, without reading the body
+        await asyncio.sleep(0.01)
+        return await response.raw.read()
+
+    assert _run(send_and_read()) == b"firstsecondthird"
+    assert curl_handler.times_paused > 0
+
+
+def test_closing_streamed_body_aborts_the_transfer():
+    curl_handler = ChunkedCurlHandler([b"first", b"second"])
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    client = _client_for_pools({"http://somefakeurl/": pool})
+
+    async def send_and_close():
+        response = await client.send(_prepare_request(), stream=True)
+        response.raw.close()
+        return response
+
+    response = _run(send_and_close())
+
+    assert response.raw.closed
+    assert curl_handler.chunks == [b"first", b"second"]
+    assert pool.get_handler_from_pool() is curl_handler
@@ -0,0 +1,82 @@
+from requests_curl.buffer import CURLReceiveBuffer
+
+
+def test_buffer_returns_written_chunks():
+    buffer = CURLReceiveBuffer()
+
+    buffer.write(b"some")
+    buffer.write(b"body")
+
+    assert len(buffer) == 8
+    assert buffer.getvalue() == b"somebody"
+
+
+def test_buffer_drops_reserved_space_not_used():
+    buffer = CURLReceiveBuffer()
+
+    buffer.reserve(100)
+    buffer.write(b"somebody")
+
+    assert len(buffer) == 8
+    assert buffer.getvalue() == b"somebody"
+
+
+def test_buffer_grows_past_reserved_size():
+    buffer = CURLReceiveBuffer()
+
+    buffer.reserve(4)
+    buffer.write(b"some")
+    buffer.write(b"body")
+
+    assert buffer.getvalue() == b"somebody"
+
+
+def test_buffer_ignores_reserve_after_receiving_data():
+    buffer = CURLReceiveBuffer()
+
+    buffer.write(b"some")
+    buffer.reserve(100)
+    buffer.write(b"body")
+
+    assert buffer.getvalue() == b"somebody"
+
+
+def test_buffer_caps_reserved_size(mocker):
+    mocker.patch.object(CURLReceiveBuffer, "MAX_RESERVED_SIZE", 4)
+    buffer = CURLReceiveBuffer()
+
+    buffer.reserve(100)
+
+    assert len(buffer._buffer.getbuffer()) == 4
+
+
+def test_buffer_moves_body_larger_than_spool_size_to_file():
+    buffer = CURLReceiveBuffer(spool_size=6)
+
+    buffer.write(b"some")
+    assert not buffer.spooled
+
+    buffer.write(b"body")
+    assert buffer.spooled
+
+    assert len(buffer) == 8
+    assert buffer.getvalue() == b"somebody"
+    assert buffer.to_file().read() == b"somebody"
+
+
+def test_buffer_moves_body_reserved_larger_than_spool_size_to_file():
+    buffer = CURLReceiveBuffer(spool_size=6)
+
+    buffer.reserve(8)
+
+    assert buffer.spooled
+
+
+def test_buffer_returns_body_kept_in_memory_as_file():
+    buffer = CURLReceiveBuffer(spool_size=100)
+
+    buffer.reserve(50)
+    buffer.write(b"somebody")
+
+    assert not buffer.spooled
+    assert buffer.to_file().read() == b"somebody"
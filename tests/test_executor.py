@@ -0,0 +1,129 @@
+import pycurl
+import pytest
+
+from requests.exceptions import ConnectionError
+
+from requests_curl.adapter import CURLAdapter
+from requests_curl.executor import CURLExecutor
+from requests_curl.multi import CURLMulti
+from requests_curl.pool import CURLHandlerPool
+
+from tests.test_multi import (
+    FailingCurlHandler,
+    FakeCurlMulti,
+    FakePoolProvider,
+    _handler_with_body,
+    _prepare_request,
+)
+
+
+class SelectableCurlMulti(FakeCurlMulti):
+    def __init__(self):
+        super(SelectableCurlMulti, self).__init__()
+        self.options = {}
+
+    def setopt(self, option, value):
+        self.options[option] = value
+
+    def fdset(self):
+        return [], [], []
+
+
+def _executor_for_pools(pools):
+    pool_provider = FakePoolProvider(pools)
+    adapter = CURLAdapter(pool_provider_factory=lambda *args, **kwargs: pool_provider)
+    return CURLExecutor(
+        adapter, multi_factory=lambda: CURLMulti(multi_factory=SelectableCurlMulti)
+    )
+
+
+def test_executor_completes_submitted_requests():
+    handlers = [_handler_with_body(b"first"), _handler_with_body(b"second")]
+    pools = {
+        "http://first/": CURLHandlerPool(curl_factory=lambda: handlers[0]),
+        "http://second/": CURLHandlerPool(curl_factory=lambda: handlers[1]),
+    }
+
+    with _executor_for_pools(pools) as executor:
+        first = executor.submit(_prepare_request("http://first"))
+        second = executor.submit(_prepare_request("http://second"))
+
+        assert first.result(timeout=5).text == "first"
+        assert second.result(timeout=5).text == "second"
+
+
+def test_executor_waits_for_handlers_when_pool_is_empty():
+    curl_handler = _handler_with_body(b"somebodydata")
+    pools = {"http://somefakeurl/": CURLHandlerPool(curl_factory=lambda: curl_handler)}
+
+    with _executor_for_pools(pools) as executor:
+        futures = [
+            executor.submit(_prepare_request("http://somefakeurl")) for _ in range(3)
+        ]
+
+        responses = [future.result(timeout=5) for future in futures]
+
+    assert all(response.text == "somebodydata" for response in responses)
+
+
+def test_executor_sets_translated_exception_when_request_fails():
+    error = pycurl.error(pycurl.E_COULDNT_CONNECT, "Could not connect")
+    pools = {
+        "http://somefakeurl/": CURLHandlerPool(
+            curl_factory=lambda: FailingCurlHandler(error)
+        )
+    }
+    request = _prepare_request("http://somefakeurl")
+
+    with _executor_for_pools(pools) as executor:
+        exception = executor.submit(request).exception(timeout=5)
+
+    assert isinstance(exception, ConnectionError)
+    assert exception.request is request
+
+
+def test_executor_completes_pending_requests_on_shutdown():
+    curl_handler = _handler_with_body(b"somebodydata")
+    pools = {"http://somefakeurl/": CURLHandlerPool(curl_factory=lambda: curl_handler)}
+
+    executor = _executor_for_pools(pools)
+    future = executor.submit(_prepare_request("http://somefakeurl"))
+    executor.shutdown(wait=True)
+
+    assert future.result(timeout=0).text == "somebodydata"
+
+
+def test_executor_rejects_requests_after_shutdown():
+    executor = _executor_for_pools({})
+    executor.shutdown()
+
+    with pytest.raises(RuntimeError):
+        executor.submit(_prepare_request("http://somefakeurl"))
+
+
+def test_http2_adapter_multiplexes_requests_through_an_executor():
+    curl_handler = _handler_with_body(b"somebodydata")
+    pool_provider = FakePoolProvider(
+        {"http://somefakeurl/": CURLHandlerPool(curl_factory=lambda: curl_handler)}
+    )
+    multis = []
+
+    def multi_factory():
+        multis.append(SelectableCurlMulti())
+        return multis[-1]
+
+    adapter = CURLAdapter(
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+        multi_factory=lambda: CURLMulti(multi_factory=multi_factory),
+        http2_prior_knowledge=True,
+    )
+
+    response = adapter.send(_prepare_request("http://somefakeurl"))
+    adapter.close()
+
+    assert response.text == "somebodydata"
+    assert curl_handler.options[pycurl.HTTP_VERSION] == (
+        pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE
+    )
+    assert curl_handler.options[pycurl.PIPEWAIT] == 1
+    assert multis[0].options == {pycurl.M_PIPELINING: pycurl.PIPE_MULTIPLEX}
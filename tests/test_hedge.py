@@ -0,0 +1,186 @@
+import pycurl
+import pytest
+
+from requests import PreparedRequest
+
+from requests_curl.adapter import CURLAdapter
+from requests_curl.hedge import CURLHedgePolicy
+from requests_curl.multi import CURLMulti
+from requests_curl.pool import CURLHandlerPool
+from requests_curl.response import CURLTransferInfo
+
+from tests.test_multi import FakeCurlMulti, FakePoolProvider, _handler_with_body
+
+
+def _transfer_info(total_time):
+    return CURLTransferInfo(0, 0, 0, 0, total_time, total_time, 0, True)
+
+
+def _prepare_request(method, data=None):
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method=method, headers={}, data=data)
+    return request
+
+
+def test_hedge_policy_applies_to_idempotent_requests_without_body():
+    policy = CURLHedgePolicy()
+
+    assert policy.applies_to(_prepare_request("GET"))
+    assert policy.applies_to(_prepare_request("HEAD"))
+    assert not policy.applies_to(_prepare_request("POST"))
+    assert not policy.applies_to(_prepare_request("GET", data=b"somedata"))
+
+
+def test_hedge_policy_with_fixed_delay():
+    policy = CURLHedgePolicy(delay=0.25)
+
+    assert policy.get_delay("http://somefakeurl:80") == 0.25
+
+
+def test_hedge_policy_delay_follows_latency_percentile():
+    policy = CURLHedgePolicy(percentile=90, window_size=10, min_samples=5)
+
+    for latency in (0.5, 0.1, 0.2, 0.4):
+        policy.record_response("http://somefakeurl:80", _transfer_info(latency))
+
+    # Not enough latencies were seen yet
+    assert policy.get_delay("http://somefakeurl:80") is None
+
+    policy.record_response("http://somefakeurl:80", _transfer_info(0.3))
+
+    assert policy.get_delay("http://somefakeurl:80") == 0.5
+    assert policy.get_delay("http://otherfakeurl:80") is None
+
+    for _ in range(10):
+        policy.record_response("http://somefakeurl:80", _transfer_info(0.1))
+
+    # Only the last latencies are kept
+    assert policy.get_delay("http://somefakeurl:80") == 0.1
+
+
+def test_hedge_policy_stats():
+    policy = CURLHedgePolicy(delay=0.25)
+
+    policy.record_response("http://somefakeurl:80", _transfer_info(0.1))
+    policy.record_response("http://somefakeurl:80", _transfer_info(0.3), hedged=True)
+    policy.record_response(
+        "http://somefakeurl:80", _transfer_info(0.1), hedged=True, hedge_won=True
+    )
+
+    assert policy.stats() == {"requests": 3, "hedged": 2, "hedges_won": 1}
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    (
+        {"delay": -1},
+        {"percentile": 0},
+        {"percentile": 101},
+        {"min_samples": 0},
+        {"window_size": 10, "min_samples": 11},
+    ),
+)
+def test_hedge_policy_rejects_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        CURLHedgePolicy(**kwargs)
+
+
+class SlowCurlMulti(FakeCurlMulti):
+    """Fake multi that only completes the transfers of handlers once the fake clock
+    reaches their `ready_at` time. Waiting advances the clock."""
+
+    def __init__(self, clock):
+        super(SlowCurlMulti, self).__init__()
+        self._clock = clock
+
+    def perform(self):
+        done = [d[0] for d in self._done]
+        for curl_handler in self.handlers:
+            if curl_handler not in done and curl_handler.ready_at <= self._clock[0]:
+                curl_handler.perform()
+                self._done.append((curl_handler, None))
+
+        return pycurl.E_MULTI_OK, len(self.handlers)
+
+    def select(self, timeout):
+        self._clock[0] += timeout
+        return 0
+
+
+def _hedging_adapter(mocker, handlers, maxsize=2, multis=None):
+    clock = [0.0]
+    fake_time = mocker.patch("requests_curl.adapter.time")
+    fake_time.monotonic.side_effect = lambda: clock[0]
+
+    def multi_factory():
+        multi = CURLMulti(multi_factory=lambda: SlowCurlMulti(clock))
+        if multis is not None:
+            multis.append(multi)
+        return multi
+
+    pool = CURLHandlerPool(maxsize=maxsize, curl_factory=lambda: handlers.pop(0))
+    pool_provider = FakePoolProvider({"http://somefakeurl/": pool})
+    policy = CURLHedgePolicy(delay=0.5)
+    adapter = CURLAdapter(
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+        multi_factory=multi_factory,
+        hedge_policy=policy,
+    )
+
+    return adapter, pool, policy
+
+
+def _handler_ready_at(body, ready_at):
+    curl_handler = _handler_with_body(body)
+    curl_handler.ready_at = ready_at
+    return curl_handler
+
+
+def test_adapter_hedges_slow_request(mocker):
+    handlers = [_handler_ready_at(b"first", 3.0), _handler_ready_at(b"second", 0.75)]
+    adapter, pool, policy = _hedging_adapter(mocker, list(handlers))
+
+    response = adapter.send(_prepare_request("GET"))
+
+    assert response.content == b"second"
+    assert policy.stats() == {"requests": 1, "hedged": 1, "hedges_won": 1}
+    # The first copy was aborted, and both handlers are back in the pool
+    assert not handlers[0].performed
+    assert pool.stats()["idle"] == 2
+
+
+def test_adapter_does_not_hedge_fast_request(mocker):
+    handlers = [_handler_ready_at(b"first", 0.25), _handler_ready_at(b"second", 0.0)]
+    adapter, pool, policy = _hedging_adapter(mocker, handlers)
+
+    response = adapter.send(_prepare_request("GET"))
+
+    assert response.content == b"first"
+    assert policy.stats() == {"requests": 1, "hedged": 0, "hedges_won": 0}
+    assert len(handlers) == 1
+
+
+def test_adapter_waits_for_slow_request_when_pool_is_empty(mocker):
+    handlers = [_handler_ready_at(b"first", 3.0)]
+    adapter, pool, policy = _hedging_adapter(mocker, handlers, maxsize=1)
+
+    response = adapter.send(_prepare_request("GET"))
+
+    assert response.content == b"first"
+    assert policy.stats() == {"requests": 1, "hedged": 0, "hedges_won": 0}
+
+
+def test_adapter_keeps_multi_of_hedged_requests(mocker):
+    handlers = [_handler_ready_at(b"first", 0.0), _handler_ready_at(b"second", 0.0)]
+    multis = []
+    adapter, pool, policy = _hedging_adapter(mocker, handlers, multis=multis)
+
+    adapter.send(_prepare_request("GET"))
+    adapter.send(_prepare_request("GET"))
+
+    # Connections are kept by the multi, so both requests can reuse them
+    assert len(multis) == 1
+
+    adapter.close()
+
+    assert multis[0]._multi.closed
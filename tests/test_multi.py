@@ -0,0 +1,280 @@
+import pycurl
+import pytest
+
+from requests import PreparedRequest
+from requests.exceptions import ConnectionError, ReadTimeout
+
+from requests_curl.adapter import CURLAdapter
+from requests_curl.multi import CURLMulti
+from requests_curl.pool import CURLHandlerPool, EmptyPool
+from requests_curl.request import CURLRequest
+
+from tests.test_pool import FakeCurlHandler
+
+
+class FakeCurlMulti:
+    def __init__(self):
+        self.handlers = []
+        self.closed = False
+        self._done = []
+
+    def add_handle(self, curl_handler):
+        self.handlers.append(curl_handler)
+
+    def remove_handle(self, curl_handler):
+        self.handlers.remove(curl_handler)
+
+    def perform(self):
+        # Each call to perform completes a single transfer
+        running = [h for h in self.handlers if h not in [d[0] for d in self._done]]
+        if running:
+            curl_handler = running[0]
+            try:
+                curl_handler.perform()
+                self._done.append((curl_handler, None))
+            except pycurl.error as error:
+                self._done.append((curl_handler, error))
+
+        return pycurl.E_MULTI_OK, len(self.handlers)
+
+    def info_read(self):
+        succeeded = [h for h, error in self._done if error is None]
+        failed = [(h, e.args[0], e.args[1]) for h, e in self._done if e is not None]
+        self._done = []
+        return 0, succeeded, failed
+
+    def timeout(self):
+        return -1
+
+    def select(self, timeout):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+class FailingCurlHandler(FakeCurlHandler):
+    def __init__(self, error):
+        super(FailingCurlHandler, self).__init__()
+        self.error = error
+
+    def perform(self):
+        raise self.error
+
+
+class FakePoolProvider:
+    def __init__(self, pools):
+        self._pools = pools
+
+    def get_pool_for_url(self, url, tls_config=None):
+        return self._pools[url]
+
+    def clear(self):
+        pass
+
+
+def _prepare_request(url):
+    request = PreparedRequest()
+    request.prepare(url=url, method="GET", headers={})
+    return request
+
+
+def _handler_with_body(body):
+    curl_handler = FakeCurlHandler()
+    curl_handler.body = body
+    curl_handler.http_status = 200
+    curl_handler.header_lines = [b"HTTP/1.1 200 OK\n"]
+    return curl_handler
+
+
+def _adapter_for_pools(pools):
+    pool_provider = FakePoolProvider(pools)
+    return CURLAdapter(
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+        multi_factory=lambda: CURLMulti(multi_factory=FakeCurlMulti),
+    )
+
+
+def test_multi_completes_added_transfers():
+    curl_handler = _handler_with_body(b"somebodydata")
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    curl_request = CURLRequest(_prepare_request("http://somefakeurl"))
+
+    multi = CURLMulti(multi_factory=FakeCurlMulti)
+    transfer = pool.start_transfer(curl_request)
+    multi.add_transfer(transfer)
+
+    assert len(multi) == 1
+
+    completed = multi.perform()
+
+    assert completed == [(transfer, None)]
+    assert len(multi) == 0
+    assert curl_handler.performed
+
+
+def test_multi_reports_failed_transfers():
+    error = pycurl.error(pycurl.E_COULDNT_CONNECT, "Could not connect")
+    curl_handler = FailingCurlHandler(error)
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    curl_request = CURLRequest(_prepare_request("http://somefakeurl"))
+
+    multi = CURLMulti(multi_factory=FakeCurlMulti)
+    transfer = pool.start_transfer(curl_request)
+    multi.add_transfer(transfer)
+
+    ((completed_transfer, curl_error),) = multi.perform()
+
+    assert completed_transfer is transfer
+    assert curl_error.args == error.args
+
+
+def test_multi_close_gives_handlers_back_to_pool():
+    curl_handler = _handler_with_body(b"somebodydata")
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    curl_request = CURLRequest(_prepare_request("http://somefakeurl"))
+
+    multi = CURLMulti(multi_factory=FakeCurlMulti)
+    multi.add_transfer(pool.start_transfer(curl_request))
+
+    multi.close()
+
+    assert len(multi) == 0
+    assert pool.get_handler_from_pool() is curl_handler
+
+
+def test_adapter_send_many_yields_all_responses():
+    handlers = [_handler_with_body(b"first"), _handler_with_body(b"second")]
+    pools = {
+        "http://first/": CURLHandlerPool(curl_factory=lambda: handlers[0]),
+        "http://second/": CURLHandlerPool(curl_factory=lambda: handlers[1]),
+    }
+    adapter = _adapter_for_pools(pools)
+
+    requests = [_prepare_request("http://first"), _prepare_request("http://second")]
+
+    responses = list(adapter.send_many(requests))
+
+    assert sorted(response.text for response in responses) == ["first", "second"]
+    for response in responses:
+        assert response.request in requests
+
+
+def test_adapter_send_many_waits_for_handlers_when_pool_is_empty():
+    curl_handler = _handler_with_body(b"somebodydata")
+    pools = {"http://somefakeurl/": CURLHandlerPool(curl_factory=lambda: curl_handler)}
+    adapter = _adapter_for_pools(pools)
+
+    requests = [_prepare_request("http://somefakeurl") for _ in range(3)]
+
+    responses = list(adapter.send_many(requests, concurrency=3))
+
+    assert len(responses) == 3
+    assert all(response.text == "somebodydata" for response in responses)
+
+
+def test_adapter_send_many_does_not_make_other_pools_wait_for_an_empty_one():
+    busy_handler = _handler_with_body(b"busy")
+    idle_handler = _handler_with_body(b"idle")
+    pools = {
+        "http://busy/": CURLHandlerPool(curl_factory=lambda: busy_handler),
+        "http://idle/": CURLHandlerPool(curl_factory=lambda: idle_handler),
+    }
+    adapter = _adapter_for_pools(pools)
+
+    requests = [_prepare_request("http://busy") for _ in range(3)]
+    requests.append(_prepare_request("http://idle"))
+
+    responses = list(adapter.send_many(requests, concurrency=4))
+
+    # The request to the idle pool is started while the busy pool has no handler,
+    # instead of waiting for all the requests to the busy one
+    assert [response.text for response in responses] == ["busy", "idle", "busy", "busy"]
+    assert [response.request for response in responses if response.text == "busy"] == (
+        requests[:3]
+    )
+
+
+def test_adapter_send_many_raises_when_a_request_fails():
+    error = pycurl.error(pycurl.E_COULDNT_CONNECT, "Could not connect")
+    pools = {
+        "http://somefakeurl/": CURLHandlerPool(
+            curl_factory=lambda: FailingCurlHandler(error)
+        )
+    }
+    adapter = _adapter_for_pools(pools)
+
+    with pytest.raises(ConnectionError):
+        list(adapter.send_many([_prepare_request("http://somefakeurl")]))
+
+
+def test_adapter_send_many_can_return_exceptions():
+    error = pycurl.error(pycurl.E_OPERATION_TIMEDOUT, "Operation timed out")
+    pools = {
+        "http://failing/": CURLHandlerPool(
+            curl_factory=lambda: FailingCurlHandler(error)
+        ),
+        "http://working/": CURLHandlerPool(
+            curl_factory=lambda: _handler_with_body(b"somebodydata")
+        ),
+    }
+    adapter = _adapter_for_pools(pools)
+
+    failing_request = _prepare_request("http://failing")
+    working_request = _prepare_request("http://working")
+
+    results = list(
+        adapter.send_many([failing_request, working_request], return_exceptions=True)
+    )
+
+    (timeout_error,) = [r for r in results if isinstance(r, ReadTimeout)]
+    (response,) = [r for r in results if not isinstance(r, ReadTimeout)]
+
+    assert timeout_error.request is failing_request
+    assert response.text == "somebodydata"
+
+
+def test_adapter_send_many_raises_empty_pool_when_nothing_is_running():
+    pool = CURLHandlerPool(curl_factory=lambda: _handler_with_body(b""))
+    pool.get_handler_from_pool()
+    adapter = _adapter_for_pools({"http://somefakeurl/": pool})
+
+    with pytest.raises(EmptyPool):
+        list(adapter.send_many([_prepare_request("http://somefakeurl")]))
+
+
+class BatchCurlMulti(FakeCurlMulti):
+    """Fake multi that completes all the running transfers at once"""
+
+    def perform(self):
+        while len(self._done) < len(self.handlers):
+            super(BatchCurlMulti, self).perform()
+
+        return pycurl.E_MULTI_OK, len(self.handlers)
+
+
+def test_adapter_send_many_gives_back_unconsumed_handlers_when_closed():
+    handlers = [_handler_with_body(b"first"), _handler_with_body(b"second")]
+    pool = CURLHandlerPool(maxsize=2, curl_factory=lambda: handlers.pop())
+    pool_provider = FakePoolProvider({"http://somefakeurl/": pool})
+    adapter = CURLAdapter(
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+        multi_factory=lambda: CURLMulti(multi_factory=BatchCurlMulti),
+    )
+
+    requests = [_prepare_request("http://somefakeurl") for _ in range(2)]
+
+    responses = adapter.send_many(requests)
+    next(responses)
+    responses.close()
+
+    pool.get_handler_from_pool()
+    pool.get_handler_from_pool()
+
+
+@pytest.mark.parametrize("concurrency", (0, -1))
+def test_adapter_send_many_rejects_invalid_concurrency(concurrency):
+    adapter = _adapter_for_pools({})
+
+    with pytest.raises(ValueError):
+        list(adapter.send_many([], concurrency=concurrency))
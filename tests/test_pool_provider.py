@@ -1,9 +1,13 @@
+import pycurl
 import pytest
+import threading
 
 from requests.exceptions import InvalidProxyURL
+from urllib3.exceptions import LocationValueError, URLSchemeUnknown
 
 from requests_curl.pool_provider import CURLPoolProvider
 from requests_curl.pool import CURLHandlerPool, ProxyCURLHandlerPool
+from requests_curl.tls import CURLTLSConfig
 
 
 def test_can_create_empty_pool_provider():
@@ -244,3 +248,276 @@ def test_malformed_proxy_url_raises_invalid_proxy_url():
 
     with pytest.raises(InvalidProxyURL):
         pool_provider.get_pool_for_proxied_url(proxy_url, url)
+
+
+def test_provider_attaches_the_same_curl_share_to_all_handlers(mocker):
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    curl_factory = mocker.patch("requests_curl.pool_provider.pycurl.Curl")
+    handlers = [mocker.Mock(), mocker.Mock()]
+    curl_factory.side_effect = handlers
+
+    pools = [
+        pool_provider.get_pool_for_url("https://someurl.io"),
+        pool_provider.get_pool_for_proxied_url(
+            "http://localhost:8080", "https://someurl.io"
+        ),
+    ]
+
+    for pool in pools:
+        pool.get_handler_from_pool()
+
+    for curl_handler in handlers:
+        curl_handler.setopt.assert_called_once_with(
+            pycurl.SHARE, pool_provider.curl_share
+        )
+
+
+def test_provider_does_not_share_the_connections_cache(mocker):
+    curl_share_factory = mocker.patch("requests_curl.pool_provider.pycurl.CurlShare")
+
+    CURLPoolProvider(max_pools=10, max_pool_size=1, pool_block=True)
+
+    curl_share = curl_share_factory.return_value
+    assert curl_share.setopt.call_args_list == [
+        mocker.call(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS),
+        mocker.call(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION),
+    ]
+
+
+def test_provider_creates_pools_with_warm_handlers(mocker):
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=10,
+        pool_block=True,
+        pool_warm_size=2,
+    )
+
+    curl_factory = mocker.patch("requests_curl.pool_provider.pycurl.Curl")
+
+    pool_provider.get_pool_for_url("https://someurl.io")
+
+    assert curl_factory.call_count == 2
+
+
+def test_provider_stats_are_reported_by_host_key():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=10,
+        pool_block=True,
+    )
+
+    pool_provider.get_pool_for_url("https://someurl.io")
+    pool_provider.get_pool_for_url("http://someurl.io:8080/path")
+    pool_provider.get_pool_for_proxied_url("http://localhost:8080", "http://someurl.io")
+
+    stats = pool_provider.stats()
+
+    assert sorted(stats) == [
+        "http://someurl.io:80 via http://localhost:8080",
+        "http://someurl.io:8080",
+        "https://someurl.io:443",
+    ]
+    assert stats["https://someurl.io:443"]["requests"] == 0
+
+
+def test_provider_stats_skip_cleared_pools():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=10,
+        pool_block=True,
+    )
+
+    pool_provider.get_pool_for_url("https://someurl.io")
+    pool_provider.clear()
+
+    assert pool_provider.stats() == {}
+
+
+def test_provider_closes_pools_of_least_recently_used_proxy():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+        max_proxies=2,
+    )
+
+    url = "https://someurl.io"
+    first_pool = pool_provider.get_pool_for_proxied_url("http://first:8080", url)
+    second_pool = pool_provider.get_pool_for_proxied_url("http://second:8080", url)
+    # Makes the first proxy the most recently used one
+    pool_provider.get_pool_for_proxied_url("http://first:8080", url)
+    third_pool = pool_provider.get_pool_for_proxied_url("http://third:8080", url)
+
+    assert first_pool.open
+    assert not second_pool.open
+    assert third_pool.open
+    assert len(pool_provider) == 2
+
+    new_second_pool = pool_provider.get_pool_for_proxied_url("http://second:8080", url)
+
+    assert new_second_pool is not second_pool
+    assert not first_pool.open
+
+
+def test_provider_creates_one_pool_for_proxy_used_concurrently():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    barrier = threading.Barrier(8)
+    pools = []
+
+    def get_pool():
+        barrier.wait()
+        pools.append(
+            pool_provider.get_pool_for_proxied_url(
+                "http://localhost:8080", "https://someurl.io"
+            )
+        )
+
+    threads = [threading.Thread(target=get_pool) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(pool is pools[0] for pool in pools)
+    assert len(pool_provider) == 1
+
+
+def test_provider_closes_pools_when_cleared():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    pool = pool_provider.get_pool_for_url("https://someurl.io")
+    proxied_pool = pool_provider.get_pool_for_proxied_url(
+        "http://localhost:8080", "https://someurl.io"
+    )
+
+    pool_provider.clear()
+
+    assert not pool.open
+    assert not proxied_pool.open
+
+
+def test_provider_returns_the_same_pool_for_the_same_origin_spelled_differently():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    pool = pool_provider.get_pool_for_url("https://someurl.io")
+
+    assert pool_provider.get_pool_for_url("HTTPS://SomeUrl.io:443/path?q=1") is pool
+    assert pool_provider.get_pool_for_url("https://someurl.io?q=1") is pool
+    assert len(pool_provider) == 1
+
+
+def test_provider_closes_least_recently_used_pool():
+    pool_provider = CURLPoolProvider(
+        max_pools=2,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    first_pool = pool_provider.get_pool_for_url("https://first.io")
+    second_pool = pool_provider.get_pool_for_url("https://second.io")
+    # Makes the first pool the most recently used one
+    pool_provider.get_pool_for_url("https://first.io/path")
+    third_pool = pool_provider.get_pool_for_url("https://third.io")
+
+    assert first_pool.open
+    assert not second_pool.open
+    assert third_pool.open
+    assert len(pool_provider) == 2
+
+
+@pytest.mark.parametrize(
+    "url, expected_error",
+    (
+        ("ftp://someurl.io", URLSchemeUnknown),
+        ("https://", LocationValueError),
+    ),
+)
+def test_provider_raises_for_urls_without_pool(url, expected_error):
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    with pytest.raises(expected_error):
+        pool_provider.get_pool_for_url(url)
+
+    assert len(pool_provider) == 0
+
+
+def test_provider_provides_different_pools_for_different_tls_configs():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    url = "https://someurl.io"
+    default_pool = pool_provider.get_pool_for_url(url)
+    unverified_pool = pool_provider.get_pool_for_url(
+        url, tls_config=CURLTLSConfig.get(verify=False)
+    )
+    client_cert_pool = pool_provider.get_pool_for_url(
+        url, tls_config=CURLTLSConfig.get(cert=("/some/cert", "/some/key"))
+    )
+
+    assert pool_provider.get_pool_for_url(url, CURLTLSConfig.get()) is default_pool
+    assert len({default_pool, unverified_pool, client_cert_pool}) == 3
+    assert sorted(pool_provider.stats()) == [
+        "https://someurl.io:443",
+        "https://someurl.io:443 (verify=False, cert=None)",
+        "https://someurl.io:443 (verify=True, cert=('/some/cert', '/some/key'))",
+    ]
+
+
+def test_provider_ignores_tls_config_of_plain_http_urls():
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    url = "http://someurl.io"
+    pool = pool_provider.get_pool_for_url(url)
+
+    assert pool_provider.get_pool_for_url(url, CURLTLSConfig.get(False)) is pool
+
+
+def test_provider_leaves_inherited_pools_to_parent_process(mocker):
+    pool_provider = CURLPoolProvider(
+        max_pools=10,
+        max_pool_size=1,
+        pool_block=True,
+    )
+
+    curl_share = pool_provider.curl_share
+    inherited_pool = pool_provider.get_pool_for_url("https://someurl.io")
+
+    mocker.patch("requests_curl.pool_provider.os.getpid", return_value=-1)
+    mocker.patch("requests_curl.pool.os.getpid", return_value=-1)
+
+    pool = pool_provider.get_pool_for_url("https://someurl.io")
+    pool_provider.clear()
+
+    assert pool is not inherited_pool
+    assert pool_provider.curl_share is not curl_share
+    assert inherited_pool.open
+    assert not pool.open
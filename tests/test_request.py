@@ -5,7 +5,9 @@ import six
 
 from requests import PreparedRequest
 from requests.adapters import DEFAULT_CA_BUNDLE_PATH
-from requests_curl.request import CURLRequest
+from urllib3.util import Timeout
+from requests_curl.request import CURLReadTimer, CURLRequest
+from requests_curl.response import CURLResponse
 
 
 def test_request_property():
@@ -311,12 +313,13 @@ def test_curl_options_for_get_with_timeout_in_seconds():
         pycurl.HTTPHEADER: [],
         pycurl.SSL_VERIFYHOST: 0,
         pycurl.SSL_VERIFYPEER: 0,
-        pycurl.TIMEOUT_MS: 3200,
+        pycurl.CONNECTTIMEOUT_MS: 3200,
     }
 
     curl_options = curl_request.options
 
     assert sorted(curl_options.items()) == sorted(expected_options.items())
+    assert curl_request.read_timeout == 3.2
 
 
 @pytest.mark.parametrize(
@@ -339,13 +342,39 @@ def test_curl_options_for_get_with_multi_timeout_values(timeout):
         pycurl.HTTPHEADER: [],
         pycurl.SSL_VERIFYHOST: 0,
         pycurl.SSL_VERIFYPEER: 0,
-        pycurl.TIMEOUT_MS: 2234,
         pycurl.CONNECTTIMEOUT_MS: 1234,
     }
 
     curl_options = curl_request.options
 
     assert sorted(curl_options.items()) == sorted(expected_options.items())
+    assert curl_request.read_timeout == 1
+
+
+@pytest.mark.parametrize(
+    "timeout, expected_timeout_options, expected_read_timeout",
+    (
+        (
+            Timeout(connect=1.5, read=10, total=60),
+            {pycurl.CONNECTTIMEOUT_MS: 1500, pycurl.TIMEOUT_MS: 60000},
+            10,
+        ),
+        (Timeout(total=2.5), {pycurl.TIMEOUT_MS: 2500}, None),
+        (Timeout(read=0.25), {}, 0.25),
+    ),
+)
+def test_curl_options_for_get_with_urllib3_timeout(
+    timeout, expected_timeout_options, expected_read_timeout
+):
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(
+        url="http://somefakeurl",
+        method="GET",
+    )
+    curl_request = CURLRequest(prepared_request, timeout=timeout)
+
+    assert curl_request.build_timeout_options() == expected_timeout_options
+    assert curl_request.read_timeout == expected_read_timeout
 
 
 def test_curl_options_for_get_with_verify_as_true():
@@ -458,3 +487,171 @@ def test_curl_options_for_get_with_cert_and_key():
     curl_options = curl_request.options
 
     assert sorted(curl_options.items()) == sorted(expected_options.items())
+
+
+@pytest.mark.parametrize(
+    "http_version",
+    (pycurl.CURL_HTTP_VERSION_2TLS, pycurl.CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE),
+)
+def test_curl_options_for_get_with_http2(http_version):
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(
+        url="http://somefakeurl",
+        method="GET",
+    )
+    curl_request = CURLRequest(
+        prepared_request, verify=False, http_version=http_version
+    )
+
+    expected_options = {
+        pycurl.URL: "http://somefakeurl/",
+        pycurl.HTTPHEADER: [],
+        pycurl.SSL_VERIFYHOST: 0,
+        pycurl.SSL_VERIFYPEER: 0,
+        pycurl.HTTP_VERSION: http_version,
+        pycurl.PIPEWAIT: 1,
+    }
+
+    curl_options = curl_request.options
+
+    assert sorted(curl_options.items()) == sorted(expected_options.items())
+
+
+def test_curl_options_for_get_with_http1_do_not_wait_for_multiplexing():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(
+        url="http://somefakeurl",
+        method="GET",
+    )
+    curl_request = CURLRequest(
+        prepared_request, verify=False, http_version=pycurl.CURL_HTTP_VERSION_1_1
+    )
+
+    curl_options = curl_request.options
+
+    assert curl_options[pycurl.HTTP_VERSION] == pycurl.CURL_HTTP_VERSION_1_1
+    assert pycurl.PIPEWAIT not in curl_options
+
+
+def test_curl_options_for_get_with_native_decoding():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(
+        url="http://somefakeurl",
+        method="GET",
+        headers={"Accept-Encoding": "gzip, deflate", "Accept": "*/*"},
+    )
+    curl_request = CURLRequest(prepared_request, verify=False, native_decoding=True)
+
+    expected_options = {
+        pycurl.URL: "http://somefakeurl/",
+        pycurl.HTTPHEADER: ["Accept: */*"],
+        pycurl.SSL_VERIFYHOST: 0,
+        pycurl.SSL_VERIFYPEER: 0,
+        pycurl.ACCEPT_ENCODING: "",
+    }
+
+    curl_options = curl_request.options
+
+    assert curl_request.native_decoding
+    assert sorted(curl_options.items()) == sorted(expected_options.items())
+
+
+def test_curl_options_for_get_with_body_size_limits():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(
+        url="http://somefakeurl",
+        method="GET",
+    )
+    curl_request = CURLRequest(
+        prepared_request, verify=False, spool_size=100, max_body_size=1000
+    )
+
+    expected_options = {
+        pycurl.URL: "http://somefakeurl/",
+        pycurl.HTTPHEADER: [],
+        pycurl.SSL_VERIFYHOST: 0,
+        pycurl.SSL_VERIFYPEER: 0,
+        pycurl.MAXFILESIZE_LARGE: 1000,
+    }
+
+    curl_options = curl_request.options
+
+    assert curl_request.spool_size == 100
+    assert sorted(curl_options.items()) == sorted(expected_options.items())
+
+
+def _read_timer(mocker, read_timeout, clock):
+    mocker.patch("requests_curl.request._HAS_PREREQ_FUNCTION", True)
+    return CURLReadTimer(read_timeout, clock=lambda: clock[0])
+
+
+def test_read_timer_aborts_transfer_that_stalls_after_data(mocker):
+    clock = [0.0]
+    read_timer = _read_timer(mocker, 1, clock)
+    read_timer.start()
+
+    clock[0] = 0.5
+    assert read_timer.check_progress(2 << 20, 1 << 20, 0, 0) == 0
+
+    clock[0] = 1.4
+    assert read_timer.check_progress(2 << 20, 1 << 20, 0, 0) == 0
+
+    # A second without data since the last megabyte
+    clock[0] = 1.5
+    assert read_timer.check_progress(2 << 20, 1 << 20, 0, 0) == 1
+
+
+def test_read_timer_starts_once_connected(mocker):
+    clock = [0.0]
+    read_timer = _read_timer(mocker, 1, clock)
+
+    # Connecting is limited by the connect timeout
+    clock[0] = 5.0
+    assert read_timer.check_progress(0, 0, 0, 0) == 0
+
+    read_timer.start()
+
+    clock[0] = 5.5
+    assert read_timer.check_progress(0, 0, 0, 0) == 0
+
+    clock[0] = 6.0
+    assert read_timer.check_progress(0, 0, 0, 0) == 1
+
+
+def test_read_timer_counts_headers_as_data(mocker):
+    clock = [0.0]
+    read_timer = _read_timer(mocker, 1, clock)
+    read_timer.start()
+
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    response = CURLResponse(CURLRequest(prepared_request))
+    options = read_timer.get_curl_options(response)
+
+    clock[0] = 0.75
+    options[pycurl.HEADERFUNCTION](b"HTTP/1.1 200 OK\r\n")
+
+    clock[0] = 1.5
+    assert read_timer.check_progress(0, 0, 0, 0) == 0
+    assert response.headers_complete is False
+    assert options[pycurl.XFERINFOFUNCTION] == read_timer.check_progress
+
+
+def test_read_timer_does_not_run_while_paused(mocker):
+    clock = [0.0]
+    read_timer = _read_timer(mocker, 1, clock)
+    read_timer.start()
+    assert read_timer.check_progress(100, 10, 0, 0) == 0
+    read_timer.pause()
+
+    # Waiting for the body to be read is not the server going without sending data
+    clock[0] = 10.0
+    assert read_timer.check_progress(100, 10, 0, 0) == 0
+
+    read_timer.resume()
+
+    clock[0] = 10.5
+    assert read_timer.check_progress(100, 10, 0, 0) == 0
+
+    clock[0] = 11.0
+    assert read_timer.check_progress(100, 10, 0, 0) == 1
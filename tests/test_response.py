@@ -1,7 +1,10 @@
+import gzip
 import pytest
 
+from datetime import timedelta
+
 from requests import PreparedRequest, Response
-from requests_curl.response import CURLResponse
+from requests_curl.response import CURLRawResponse, CURLResponse, CURLTransferInfo
 from requests_curl.request import CURLRequest
 
 
@@ -56,6 +59,54 @@ def test_curl_response_with_data_and_headers_to_request_response():
     assert sorted(req_response.headers.items()) == sorted(expected_headers.items())
 
 
+def test_curl_response_content_shorter_than_content_length():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.add_headers_from_raw_lines(
+        [b"HTTP/1.1 200 OK\r\n", b"Content-Length: 100\r\n", b"\r\n"]
+    )
+    response.body.write(b"someresponsedata")
+
+    req_response = response.to_requests_response()
+
+    assert req_response.content == b"someresponsedata"
+
+
+def test_curl_response_with_spooled_body_to_request_response():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request, spool_size=4)
+
+    response = CURLResponse(curl_request)
+    response.add_headers_from_raw_lines(
+        [b"HTTP/1.1 200 OK\r\n", b"Content-Length: 16\r\n", b"\r\n"]
+    )
+    response.body.write(b"someresponsedata")
+
+    req_response = response.to_requests_response()
+
+    assert response.body.spooled
+    assert req_response.content == b"someresponsedata"
+
+
+def test_curl_response_to_head_request_reserves_no_body(mocker):
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="HEAD", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    reserve = mocker.spy(response.body, "reserve")
+    response.add_headers_from_raw_lines(
+        [b"HTTP/1.1 200 OK\r\n", b"Content-Length: 100\r\n", b"\r\n"]
+    )
+
+    assert not reserve.called
+    assert response.to_requests_response().content == b""
+
+
 @pytest.mark.parametrize(
     "header_lines, expected_headers",
     (
@@ -124,3 +175,174 @@ def test_curl_response_with_cookies():
     assert len(req_response.cookies) == 2
     assert req_response.cookies.get("foo") == "123"
     assert req_response.cookies.get("bar") == "abc"
+
+
+def test_curl_response_keeps_all_values_of_repeated_headers():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.add_headers_from_raw_lines(
+        [
+            b"HTTP/1.1 200 OK\r\n",
+            b"Set-Cookie: foo=123\r\n",
+            b"set-cookie: bar=abc\r\n",
+            b"\r\n",
+        ]
+    )
+
+    assert response.headers.getlist("Set-Cookie") == ["foo=123", "bar=abc"]
+
+
+def test_curl_response_only_keeps_headers_of_last_response():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.add_headers_from_raw_lines(
+        [
+            b"HTTP/1.1 100 Continue\r\n",
+            b"X-Informational: yes\r\n",
+            b"\r\n",
+            b"HTTP/1.1 200 OK\r\n",
+            b"Content-Language: en-US\r\n",
+            b"\r\n",
+        ]
+    )
+
+    assert dict(response.headers) == {"Content-Language": "en-US"}
+
+
+def test_curl_response_without_cookies_skips_cookie_extraction(mocker):
+    extract_cookies = mocker.patch("requests_curl.response.extract_cookies_to_jar")
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.add_headers_from_raw_lines(
+        [b"HTTP/1.1 200 OK\r\n", b"Content-Language: en-US\r\n", b"\r\n"]
+    )
+
+    req_response = response.to_requests_response()
+
+    assert not extract_cookies.called
+    assert len(req_response.cookies) == 0
+
+
+def test_curl_response_with_transfer_info_to_request_response():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    transfer_info = CURLTransferInfo(
+        namelookup_time=0.01,
+        connect_time=0.02,
+        appconnect_time=0.0,
+        pretransfer_time=0.03,
+        starttransfer_time=0.25,
+        total_time=0.5,
+        num_connects=0,
+        connection_reused=True,
+    )
+
+    curl_response = CURLResponse(curl_request)
+    curl_response.transfer_info = transfer_info
+
+    req_response = curl_response.to_requests_response()
+
+    assert req_response.transfer_info is transfer_info
+    assert req_response.elapsed == timedelta(seconds=0.25)
+
+
+def test_natively_decoded_curl_response_is_not_decoded_again():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request, native_decoding=True)
+
+    response = CURLResponse(curl_request)
+    response.headers = {"Content-Encoding": "gzip", "Content-Length": "10"}
+    # libcurl writes the body once decoded
+    response.body.write(b"somedecodedresponsedata")
+
+    req_response = response.to_requests_response()
+
+    assert req_response.content == b"somedecodedresponsedata"
+    assert req_response.headers["Content-Encoding"] == "gzip"
+
+
+def test_buffered_curl_response_content_is_not_copied_by_urllib3():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.body.write(b"someresponsedata")
+
+    req_response = response.to_requests_response()
+
+    assert isinstance(req_response.raw, CURLRawResponse)
+    assert req_response.raw.status == 200
+
+    chunks = list(req_response.iter_content(chunk_size=4))
+
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    assert b"".join(chunks) == b"someresponsedata"
+    assert req_response.content == b"someresponsedata"
+
+
+def test_buffered_curl_response_iter_lines():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.body.write(b"first line\nsecond line\nthird")
+
+    req_response = response.to_requests_response()
+    lines = list(req_response.iter_lines(chunk_size=4))
+
+    assert lines == [b"first line", b"second line", b"third"]
+
+
+def test_encoded_curl_response_is_decoded_by_urllib3():
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    response = CURLResponse(curl_request)
+    response.headers = {"Content-Encoding": "gzip"}
+    response.body.write(gzip.compress(b"someresponsedata"))
+
+    req_response = response.to_requests_response()
+
+    assert not isinstance(req_response.raw, CURLRawResponse)
+    assert req_response.content == b"someresponsedata"
+
+
+def test_curl_raw_response_reads_remaining_body():
+    raw = CURLRawResponse(b"someresponsedata", {}, 200)
+
+    assert raw.read(4) == b"some"
+    assert raw.read() == b"responsedata"
+    assert raw.read() == b""
+    assert list(raw.stream()) == []
+
+
+def test_curl_raw_response_streams_views_of_body():
+    raw = CURLRawResponse(b"someresponsedata", {}, 200)
+
+    views = list(raw.stream_views(8))
+
+    assert all(isinstance(view, memoryview) for view in views)
+    assert [view.tobytes() for view in views] == [b"someresp", b"onsedata"]
+
+
+def test_curl_raw_response_redirect_location():
+    redirect = CURLRawResponse(b"", {"Location": "http://other"}, 302)
+    not_redirect = CURLRawResponse(b"", {"Location": "http://other"}, 200)
+
+    assert redirect.get_redirect_location() == "http://other"
+    assert not_redirect.get_redirect_location() is False
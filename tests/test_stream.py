@@ -0,0 +1,216 @@
+import pycurl
+import pytest
+
+from requests import PreparedRequest
+from requests.exceptions import ChunkedEncodingError, ConnectionError
+
+from requests_curl.adapter import CURLAdapter
+from requests_curl.multi import CURLMulti
+from requests_curl.pool import CURLHandlerPool
+from requests_curl.request import CURLRequest
+from requests_curl.stream import CURLStreamingBody
+
+from tests.test_multi import FakePoolProvider
+from tests.test_pool import FakeCurlHandler
+
+
+class ChunkedCurlHandler(FakeCurlHandler):
+    """Fake handler that delivers the headers, and then a single chunk of the
+    body each time a step of the transfer is performed."""
+
+    def __init__(self, chunks, error=None):
+        super(ChunkedCurlHandler, self).__init__()
+        self.http_status = 200
+        self.header_lines = [
+            b"HTTP/1.1 200 OK\r\n",
+            b"Content-Type: text/plain\r\n",
+            b"\r\n",
+        ]
+        self.chunks = list(chunks)
+        self.error = error
+        self.steps = 0
+
+    def step(self):
+        """Returns True once the transfer is complete."""
+        self.steps += 1
+
+        if self.steps == 1:
+            self._write_headers()
+        elif self.chunks:
+            self.options[pycurl.WRITEFUNCTION](self.chunks.pop(0))
+        elif self.error is not None:
+            raise self.error
+
+        return self.steps > 1 and not self.chunks and self.error is None
+
+
+class SteppingCurlMulti:
+    def __init__(self):
+        self.handlers = []
+        self.closed = False
+        self._done = []
+
+    def add_handle(self, curl_handler):
+        self.handlers.append(curl_handler)
+
+    def remove_handle(self, curl_handler):
+        self.handlers.remove(curl_handler)
+
+    def perform(self):
+        for curl_handler in self.handlers:
+            try:
+                if curl_handler.step():
+                    self._done.append((curl_handler, None))
+            except pycurl.error as error:
+                self._done.append((curl_handler, error))
+
+        return pycurl.E_MULTI_OK, len(self.handlers)
+
+    def info_read(self):
+        succeeded = [h for h, error in self._done if error is None]
+        failed = [(h, e.args[0], e.args[1]) for h, e in self._done if e is not None]
+        self._done = []
+        return 0, succeeded, failed
+
+    def timeout(self):
+        return -1
+
+    def select(self, timeout):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+def _multi_factory():
+    return CURLMulti(multi_factory=SteppingCurlMulti)
+
+
+def _start_streaming_transfer(curl_handler):
+    prepared_request = PreparedRequest()
+    prepared_request.prepare(url="http://somefakeurl", method="GET", headers={})
+    curl_request = CURLRequest(prepared_request)
+
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    body = CURLStreamingBody(multi_factory=_multi_factory)
+    transfer = pool.start_transfer(curl_request, body=body)
+    body.start(transfer)
+
+    return pool, body, transfer
+
+
+def test_streaming_body_returns_once_headers_are_received():
+    curl_handler = ChunkedCurlHandler([b"first", b"second"])
+
+    _, _, transfer = _start_streaming_transfer(curl_handler)
+
+    assert curl_handler.steps == 1
+    assert transfer.response.http_code == 200
+    assert transfer.response.headers == {"Content-Type": "text/plain"}
+
+
+def test_streaming_body_receives_chunks_as_they_are_read():
+    curl_handler = ChunkedCurlHandler([b"first", b"second"])
+
+    _, body, _ = _start_streaming_transfer(curl_handler)
+
+    assert body.read(100) == b"first"
+    assert curl_handler.steps == 2
+    assert body.read(100) == b"second"
+    assert body.read(100) == b""
+
+
+def test_streaming_body_splits_chunks_larger_than_requested():
+    curl_handler = ChunkedCurlHandler([b"somebodydata"])
+
+    _, body, _ = _start_streaming_transfer(curl_handler)
+
+    assert body.read(4) == b"some"
+    assert body.read(4) == b"body"
+    assert body.read() == b"data"
+
+
+def test_streaming_body_gives_handler_back_once_completed():
+    curl_handler = ChunkedCurlHandler([b"somebodydata"])
+
+    pool, body, _ = _start_streaming_transfer(curl_handler)
+
+    body.read()
+
+    assert pool.get_handler_from_pool() is curl_handler
+
+
+def test_closing_streaming_body_aborts_the_transfer():
+    curl_handler = ChunkedCurlHandler([b"first", b"second"])
+
+    pool, body, _ = _start_streaming_transfer(curl_handler)
+
+    body.close()
+
+    assert body.closed
+    assert curl_handler.chunks == [b"first", b"second"]
+    assert pool.get_handler_from_pool() is curl_handler
+
+
+def test_streaming_body_raises_if_transfer_fails_while_reading():
+    error = pycurl.error(pycurl.E_RECV_ERROR, "Failure when receiving data")
+    curl_handler = ChunkedCurlHandler([b"first"], error=error)
+
+    pool, body, _ = _start_streaming_transfer(curl_handler)
+
+    assert body.read(100) == b"first"
+
+    with pytest.raises(ConnectionError):
+        body.read(100)
+
+    assert pool.get_handler_from_pool() is curl_handler
+
+
+def _send_streamed_request(curl_handler):
+    pool = CURLHandlerPool(curl_factory=lambda: curl_handler)
+    pool_provider = FakePoolProvider({"http://somefakeurl/": pool})
+    adapter = CURLAdapter(
+        pool_provider_factory=lambda *args, **kwargs: pool_provider,
+        multi_factory=_multi_factory,
+    )
+
+    request = PreparedRequest()
+    request.prepare(url="http://somefakeurl", method="GET", headers={})
+
+    return adapter.send(request, stream=True)
+
+
+def test_adapter_streams_response_content():
+    curl_handler = ChunkedCurlHandler([b"first", b"second", b"third"])
+
+    response = _send_streamed_request(curl_handler)
+
+    assert response.status_code == 200
+    assert curl_handler.steps == 1
+
+    chunks = list(response.iter_content(chunk_size=None))
+
+    assert b"".join(chunks) == b"firstsecondthird"
+
+
+def test_adapter_streams_response_content_in_fixed_size_chunks():
+    curl_handler = ChunkedCurlHandler([b"first", b"second", b"third"])
+
+    response = _send_streamed_request(curl_handler)
+
+    chunks = list(response.iter_content(chunk_size=4))
+
+    assert b"".join(chunks) == b"firstsecondthird"
+    assert response.raw.closed
+
+
+def test_streamed_response_raises_if_transfer_fails_while_iterating():
+    error = pycurl.error(pycurl.E_OPERATION_TIMEDOUT, "Operation too slow")
+    curl_handler = ChunkedCurlHandler([b"first"], error=error)
+
+    response = _send_streamed_request(curl_handler)
+
+    # urllib3 wraps errors raised by the body, so requests reports it as a
+    # broken body instead of as a timeout
+    with pytest.raises(ChunkedEncodingError):
+        list(response.iter_content(chunk_size=None))
@@ -0,0 +1,30 @@
+import pycurl
+
+from requests_curl.tls import CURLTLSConfig
+
+
+def test_tls_config_is_resolved_once(mocker):
+    isdir = mocker.patch("requests_curl.tls.os.path.isdir", return_value=False)
+
+    tls_config = CURLTLSConfig.get(verify="/some/unique/ca.pem")
+
+    assert CURLTLSConfig.get(verify="/some/unique/ca.pem") is tls_config
+    assert isdir.call_count == 1
+    assert tls_config.ca_options[pycurl.CAINFO] == "/some/unique/ca.pem"
+
+
+def test_tls_configs_with_the_same_settings_are_equal():
+    first_config = CURLTLSConfig(verify=None, cert=["/some/cert", "/some/key"])
+    second_config = CURLTLSConfig(verify=False, cert=("/some/cert", "/some/key"))
+
+    assert first_config == second_config
+    assert hash(first_config) == hash(second_config)
+    assert first_config != CURLTLSConfig(verify=False, cert="/some/cert")
+
+
+def test_tls_config_options_are_not_shared():
+    tls_config = CURLTLSConfig.get(cert="/some/cert")
+
+    tls_config.cert_options[pycurl.SSLCERT] = "/other/cert"
+
+    assert tls_config.cert_options == {pycurl.SSLCERT: "/some/cert"}